@@ -2,25 +2,122 @@ from job_daily_report import main as main_job_daily_report
 from job_daily_clockify import main as main_job_daily_clockify
 from job_resume_sprint import main as main_job_resume_sprint
 from job_resume_project import main as main_job_resume_project
-import schedule
-import time
+from job_resume_sprint_burndown import main as main_job_resume_sprint_burndown
+from job_mail_performance import main as main_job_mail_performance
+from job_jira_clockify import main as main_job_jira_clockify
+from prewarm import enable_state, main as main_prewarm
+from checkpoints import get_checkpoints
+from scheduler import Scheduler, MISFIRE_RUN_ONCE, MISFIRE_SKIP, parse_cron_field
+from tenants import run_for_tenants, run_sharded
+from functools import partial
+from job_logging import setup_logging
+import logging
 import os
 
+
+def weekday_cron(schedule_time, weekdays='1-5'):
+    """Converte um horário HH:MM em uma expressão cron."""
+    hour, minute = schedule_time.split(':')
+    return f"{int(minute)} {int(hour)} * * {weekdays}"
+
+
+def prewarm_cron(schedule_time, minutes, weekdays='1-5'):
+    """Expressão cron `minutes` minutos antes de `schedule_time`, nos mesmos dias."""
+    hour, minute = (int(part) for part in schedule_time.split(':'))
+    start = hour * 60 + minute - minutes
+    if start < 0:
+        # Passou da meia-noite: roda no dia anterior
+        start += 24 * 60
+        weekdays = ','.join(str(day) for day in sorted({(day - 1) % 7 for day in parse_cron_field(weekdays, 0, 7)}))
+    return weekday_cron(f"{start // 60}:{start % 60}", weekdays)
+
+
+# Jobs disponíveis: nome, função, agenda padrão e política de misfire.
+# A agenda de cada job pode ser sobrescrita com SCHEDULE_<NOME> (expressão cron).
+def default_jobs(schedule_time):
+    daily = weekday_cron(schedule_time)
+    return [
+        ('job_daily_report', main_job_daily_report, daily, MISFIRE_SKIP),
+        ('job_daily_clockify', main_job_daily_clockify, daily, MISFIRE_SKIP),
+        ('job_resume_sprint', main_job_resume_sprint, daily, MISFIRE_SKIP),
+        ('job_resume_project', main_job_resume_project, daily, MISFIRE_SKIP),
+        # O burndown já vai junto com o job_resume_sprint; avulso, só com SCHEDULE_JOB_RESUME_SPRINT_BURNDOWN
+        ('job_resume_sprint_burndown', main_job_resume_sprint_burndown, 'off', MISFIRE_SKIP),
+        # Só registra o cruzamento no log; agende com SCHEDULE_JOB_JIRA_CLOCKIFY
+        ('job_jira_clockify', main_job_jira_clockify, 'off', MISFIRE_SKIP),
+        # Sem acesso à data de fim de cada sprint aqui: por padrão roda na sexta-feira
+        ('job_mail_performance', main_job_mail_performance, weekday_cron(schedule_time, '5'), MISFIRE_RUN_ONCE),
+    ]
+
+
+# Jobs que dividem boards/projetos entre as réplicas no modo de shards (SHARD_DB)
+SHARDED_JOBS = {'job_daily_report', 'job_resume_sprint', 'job_resume_project', 'job_resume_sprint_burndown'}
+
+
 def main():
-    main_job_daily_report()
-    main_job_daily_clockify()
-    main_job_resume_sprint()
-    main_job_resume_project()
+    """Executa todos os jobs diários em sequência, fora do scheduler."""
+    for name, func, cron, _ in default_jobs(os.getenv("SCHEDULE_TIME", "17:00")):
+        if name != 'job_mail_performance' and cron != 'off':
+            run_for_tenants(func)
 
-if __name__ == "__main__":
+
+def resume_incomplete(scheduler):
+    """Roda de novo os jobs cuja execução do dia ficou incompleta nos checkpoints.
+
+    Cobre a queda do processo no meio da execução e os boards que falharam
+    (Jira ou Discord fora do ar): os boards já concluídos são pulados.
+    """
+    for name in sorted({job for _, job in get_checkpoints().incomplete_runs()}):
+        job = scheduler.jobs.get(name)
+        if job is None or job.running:
+            continue
+        logging.info("Execução de hoje do job %s incompleta; retomando.", name)
+        scheduler.run_job_now(name)
+
+
+def build_scheduler():
     schedule_time = os.getenv("SCHEDULE_TIME", "17:00")
-    
-    schedule.every().monday.at(schedule_time).do(main)
-    schedule.every().tuesday.at(schedule_time).do(main)
-    schedule.every().wednesday.at(schedule_time).do(main)
-    schedule.every().thursday.at(schedule_time).do(main)
-    schedule.every().friday.at(schedule_time).do(main)
-
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    misfire_grace = int(os.getenv("SCHEDULE_MISFIRE_GRACE", "300"))
+    scheduler = Scheduler(max_workers=int(os.getenv("SCHEDULER_WORKERS", "4")),
+                          state_path=os.getenv("SCHEDULER_STATE", ".cache/scheduler.json"))
+
+    for name, func, cron, misfire in default_jobs(schedule_time):
+        cron = os.getenv(f"SCHEDULE_{name.upper()}", cron)
+        if cron.strip().lower() == 'off':
+            logging.info("Job %s desativado.", name)
+            continue
+        # Jobs que não dividem o trabalho por board/projeto rodam inteiros em uma única réplica
+        if name not in SHARDED_JOBS:
+            func = run_sharded(name, func)
+        # Cada execução roda o job para todos os tenants configurados
+        scheduler.add_job(name, partial(run_for_tenants, func), cron, misfire=misfire, misfire_grace=misfire_grace)
+
+    # Pré-aquecimento: busca os dados antes do horário; no horário os jobs só fazem a consulta delta
+    prewarm_minutes = int(os.getenv("SCHEDULE_PREWARM_MINUTES", "15"))
+    cron = os.getenv("SCHEDULE_PREWARM", prewarm_cron(schedule_time, prewarm_minutes) if prewarm_minutes > 0 else 'off')
+    if cron.strip().lower() == 'off':
+        logging.info("Pré-aquecimento desativado.")
+    else:
+        enable_state()
+        scheduler.add_job('prewarm', partial(run_for_tenants, main_prewarm), cron,
+                          misfire=MISFIRE_SKIP, misfire_grace=misfire_grace)
+
+    # Retomada periódica das execuções do dia que ficaram incompletas
+    cron = os.getenv("SCHEDULE_RESUME", "*/30 * * * *")
+    if cron.strip().lower() == 'off':
+        logging.info("Retomada de execuções incompletas desativada.")
+    else:
+        scheduler.add_job('resume', partial(resume_incomplete, scheduler), cron,
+                          misfire=MISFIRE_SKIP, misfire_grace=misfire_grace)
+    return scheduler
+
+
+if __name__ == "__main__":
+    setup_logging(job='application')
+    scheduler = build_scheduler()
+    # Após uma queda, retoma na hora os jobs que não terminaram a execução de hoje
+    resume_incomplete(scheduler)
+    try:
+        scheduler.run_forever()
+    finally:
+        scheduler.shutdown(wait=False)
@@ -0,0 +1,202 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+
+from tenants import current_tenant
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    tenant TEXT NOT NULL,
+    job TEXT NOT NULL,
+    run_key TEXT NOT NULL,
+    board TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    value TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (tenant, job, run_key, board, stage)
+);
+"""
+
+# Etapas registradas por board
+STAGE_FETCHED = 'fetched'
+STAGE_COMPUTED = 'computed'
+STAGE_SENDING = 'sending'
+STAGE_DELIVERED = 'delivered'
+STAGE_COMPLETE = 'complete'
+
+# Pseudo-board de cada execução com a lista de boards/projetos esperados
+RUN_ITEMS = '*'
+STAGE_ITEMS = 'items'
+
+
+def default_run_key():
+    return os.getenv('CHECKPOINT_RUN_KEY') or datetime.now().strftime('%Y-%m-%d')
+
+
+class CheckpointStore:
+    """Checkpoints duráveis (SQLite) das execuções dos jobs, por board.
+
+    Cada execução é identificada por tenant, job e `run_key` (por padrão a data
+    do dia). Se o processo cair ou o Jira falhar no meio, a próxima tentativa
+    com a mesma chave pula os boards concluídos e reaproveita as mensagens já
+    calculadas, sem reenviar as que já foram entregues.
+    """
+
+    def __init__(self, path, retention_days=7):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+            with conn:
+                conn.execute('DELETE FROM checkpoints WHERE updated_at < ?',
+                             (time.time() - retention_days * 86400,))
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key, stage):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                'SELECT value FROM checkpoints WHERE tenant = ? AND job = ? AND run_key = ? AND board = ? AND stage = ?',
+                (*key, stage),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def stages(self, key, prefix):
+        """Etapas do board que começam com `prefix` (ex.: todas as 'delivered:N')."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT stage FROM checkpoints WHERE tenant = ? AND job = ? AND run_key = ? AND board = ? AND stage LIKE ?',
+                (*key, f'{prefix}%'),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def save(self, key, stage, value=None):
+        with self._lock, closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO checkpoints (tenant, job, run_key, board, stage, value, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (*key, stage, json.dumps(value, ensure_ascii=False, default=str), time.time()),
+                )
+
+    def delete(self, key, stage):
+        with self._lock, closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    'DELETE FROM checkpoints WHERE tenant = ? AND job = ? AND run_key = ? AND board = ? AND stage = ?',
+                    (*key, stage),
+                )
+
+    def run(self, job, run_key=None):
+        """Checkpoints da execução atual do job para o tenant atual."""
+        return RunCheckpoint(self, current_tenant().name, job, run_key or default_run_key())
+
+    def incomplete_runs(self, run_key=None):
+        """(tenant, job) das execuções com algum board esperado ainda não concluído."""
+        run_key = run_key or default_run_key()
+        incomplete = []
+        with closing(self._connect()) as conn:
+            runs = conn.execute(
+                'SELECT tenant, job, value FROM checkpoints WHERE run_key = ? AND board = ? AND stage = ?',
+                (run_key, RUN_ITEMS, STAGE_ITEMS),
+            ).fetchall()
+            for tenant, job, value in runs:
+                completed = {row[0] for row in conn.execute(
+                    'SELECT board FROM checkpoints WHERE tenant = ? AND job = ? AND run_key = ? AND stage = ?',
+                    (tenant, job, run_key, STAGE_COMPLETE),
+                )}
+                if set(json.loads(value)) - completed:
+                    incomplete.append((tenant, job))
+        return incomplete
+
+
+class RunCheckpoint:
+    def __init__(self, store, tenant, job, run_key):
+        self.store = store
+        self.tenant = tenant
+        self.job = job
+        self.run_key = run_key
+
+    def expect(self, board_ids):
+        """Registra os boards da execução, para `incomplete_runs` saber se ela terminou."""
+        self.store.save((self.tenant, self.job, self.run_key, RUN_ITEMS), STAGE_ITEMS,
+                        [str(board_id) for board_id in board_ids])
+
+    def board(self, board_id):
+        return BoardCheckpoint(self.store, (self.tenant, self.job, self.run_key, str(board_id)))
+
+
+class BoardCheckpoint:
+    """Etapas de um board dentro de uma execução: buscado, calculado, entregue e concluído."""
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+
+    @property
+    def completed(self):
+        return self.store.get(self.key, STAGE_COMPLETE) is not None
+
+    def fetched(self, value):
+        self.store.save(self.key, STAGE_FETCHED, value)
+
+    def computed(self, compute):
+        """Mensagens já calculadas nesta execução, ou calculadas agora e gravadas."""
+        messages = self.store.get(self.key, STAGE_COMPUTED)
+        if messages is None:
+            messages = compute()
+            self.store.save(self.key, STAGE_COMPUTED, messages)
+        return messages
+
+    def deliver(self, messages, send):
+        """Envia as mensagens ainda não entregues, na ordem.
+
+        A intenção de envio é gravada antes do post e a entrega depois. Se o
+        processo cair entre os dois, não há como saber se o Discord recebeu:
+        a mensagem é pulada para nunca duplicar um post.
+        """
+        delivered = self.store.stages(self.key, STAGE_DELIVERED)
+        sending = self.store.stages(self.key, STAGE_SENDING)
+        for index, message in enumerate(messages):
+            if f'{STAGE_DELIVERED}:{index}' in delivered:
+                continue
+            if f'{STAGE_SENDING}:{index}' in sending:
+                logging.warning("Mensagem %s do board %s pode já ter sido enviada; não será reenviada.",
+                                index, self.key[3])
+                continue
+            self.store.save(self.key, f'{STAGE_SENDING}:{index}')
+            try:
+                send(message)
+            except Exception:
+                # Falha conhecida: nada foi entregue, a próxima tentativa reenvia
+                self.store.delete(self.key, f'{STAGE_SENDING}:{index}')
+                raise
+            self.store.save(self.key, f'{STAGE_DELIVERED}:{index}')
+
+    def complete(self):
+        self.store.save(self.key, STAGE_COMPLETE, True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoints():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore(
+                os.getenv('CHECKPOINT_DB', os.path.join('.cache', 'checkpoints.sqlite3')),
+                retention_days=int(os.getenv('CHECKPOINT_RETENTION_DAYS', '7')),
+            )
+        return _store
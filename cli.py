@@ -0,0 +1,130 @@
+import argparse
+import logging
+import os
+import sys
+from datetime import datetime
+
+from requests import Response
+from requests.adapters import BaseAdapter
+
+from application import default_jobs
+from job_logging import log_context, new_run_id, setup_logging
+from profiling import SamplingProfiler
+from selection import select
+from tenants import get_tenants, run_for_tenants
+
+
+class DryRunAdapter(BaseAdapter):
+    """Adapter HTTP que registra o post no log em vez de enviá-lo ao Discord."""
+
+    def send(self, request, **kwargs):
+        body = request.body or b''
+        if isinstance(body, bytes):
+            body = body.decode('utf-8', errors='replace')
+        logging.info("[dry-run] %s %s (%s bytes): %s", request.method, request.url, len(body), body[:500])
+        response = Response()
+        response.status_code = 204
+        response.url = request.url
+        response.request = request
+        response._content = b''
+        return response
+
+    def close(self):
+        pass
+
+
+def enable_dry_run(tenants):
+    """Intercepta os posts para os webhooks dos tenants; Jira e Clockify continuam reais."""
+    adapter = DryRunAdapter()
+    for tenant in tenants:
+        for url in {tenant.webhook_url, *tenant.board_webhooks.values()}:
+            if url:
+                tenant.session.mount(url, adapter)
+    # Execuções de teste não contam como entregues nos checkpoints, mesmo com CHECKPOINT_RUN_KEY no .env
+    os.environ['CHECKPOINT_RUN_KEY'] = f'dry-run-{new_run_id()}'
+    # Nem gravam métricas que os dashboards leriam
+    os.environ.pop('METRICS_EXPORT_DIR', None)
+
+
+def resolve_jobs(names):
+    defaults = default_jobs(os.getenv("SCHEDULE_TIME", "17:00"))
+    jobs = {name: func for name, func, _, _ in defaults}
+    if not names:
+        return [(name, func) for name, func, cron, _ in defaults if name != 'job_mail_performance' and cron != 'off']
+    selected = []
+    for name in names:
+        full_name = name if name.startswith('job_') else f'job_{name}'
+        if full_name not in jobs:
+            raise SystemExit(f"Job desconhecido: {name}. Disponíveis: {', '.join(jobs)}")
+        selected.append((full_name, jobs[full_name]))
+    return selected
+
+
+def split_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Executa os jobs de gerenciamento imediatamente.")
+    parser.add_argument('jobs', nargs='*',
+                        help="Jobs a executar (ex.: job_daily_report ou daily_report). "
+                             "Sem jobs, executa todos os diários.")
+    parser.add_argument('--list', action='store_true', help="Lista os jobs disponíveis e sai.")
+    parser.add_argument('--boards', type=split_list, help="IDs ou nomes de boards, separados por vírgula.")
+    parser.add_argument('--projects', type=split_list, help="Chaves de projeto, separadas por vírgula.")
+    parser.add_argument('--parallel', type=int, metavar='N',
+                        help="Boards processados em paralelo por tenant (padrão: max_concurrency do tenant).")
+    parser.add_argument('--dry-run', action='store_true', help="Monta os relatórios sem enviar ao Discord.")
+    parser.add_argument('--profile', nargs='?', const='', metavar='ARQUIVO',
+                        help="Perfila a execução e grava as pilhas colapsadas (flamegraph) no arquivo "
+                             "(padrão: profile-<data>.folded).")
+    parser.add_argument('--profile-interval', type=float, default=5.0, metavar='MS',
+                        help="Intervalo de amostragem do profiler em milissegundos (padrão: 5).")
+    return parser.parse_args(argv)
+
+
+def run_jobs(jobs):
+    for name, func in jobs:
+        with log_context(job=name, run_id=new_run_id()):
+            logging.info("Executando %s.", name)
+            run_for_tenants(func)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list:
+        for name, _, cron, _ in default_jobs(os.getenv("SCHEDULE_TIME", "17:00")):
+            print(f"{name}\t{cron}")
+        return 0
+
+    setup_logging(job='cli')
+    jobs = resolve_jobs(args.jobs)
+    tenants = get_tenants()
+
+    if args.parallel:
+        # O pool compartilhado é criado no primeiro uso, com TENANT_WORKERS threads
+        os.environ['TENANT_WORKERS'] = str(max(args.parallel * len(tenants), int(os.getenv('TENANT_WORKERS', '8'))))
+        for tenant in tenants:
+            tenant.max_concurrency = max(1, args.parallel)
+    if args.dry_run:
+        enable_dry_run(tenants)
+    # Execução manual não divide os boards entre réplicas nem marca itens como concluídos no
+    # SQLite compartilhado: senão a execução agendada do dia pularia os boards
+    os.environ.pop('SHARD_DB', None)
+
+    with select(boards=args.boards, projects=args.projects):
+        if args.profile is None:
+            run_jobs(jobs)
+            return 0
+
+        path = args.profile or f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded"
+        with SamplingProfiler(interval=args.profile_interval / 1000) as profiler:
+            run_jobs(jobs)
+        profiler.write_folded(path)
+        logging.info("Perfil gravado em %s (%s amostras).", path, profiler.samples)
+        print(profiler.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
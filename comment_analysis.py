@@ -0,0 +1,100 @@
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+# Prefixos (início de palavra) que marcam um comentário como impedimento: pt, en e es
+DEFAULT_IMPEDIMENT_KEYWORDS = (
+    'impediment', 'impedid', 'bloquead', 'bloqueio', 'bloqueo', 'travad', 'obstáculo',
+    'blocked', 'blocker',
+)
+
+# Variantes acentuadas de cada letra; a busca ignora acentos e maiúsculas
+ACCENT_VARIANTS = {
+    'a': 'aáàâãä', 'e': 'eéèêë', 'i': 'iíìîï', 'o': 'oóòôõö', 'u': 'uúùûü', 'c': 'cç', 'n': 'nñ',
+}
+
+# Comentários classificados mantidos em memória (chave: id e data de atualização)
+CACHE_SIZE = 50000
+
+ClassifiedComment = namedtuple('ClassifiedComment', ['text', 'impediment'])
+
+
+def _strip_accents(text):
+    return ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+
+
+def keyword_pattern(keyword):
+    """Regex de um prefixo que aceita a palavra com ou sem acentos."""
+    parts = []
+    for char in _strip_accents(keyword.strip().lower()):
+        variants = ACCENT_VARIANTS.get(char)
+        parts.append(f'[{variants}]' if variants else re.escape(char))
+    return ''.join(parts)
+
+
+class CommentClassifier:
+    """Limpa e classifica comentários do Jira em uma única passada por comentário.
+
+    Uma só regex compilada remove as menções ([~pessoa|link]) e encontra as
+    palavras-chave de impedimento. O resultado fica em cache pela chave
+    (id do comentário, data de atualização): um comentário editado é
+    classificado de novo.
+    """
+
+    def __init__(self, keywords=DEFAULT_IMPEDIMENT_KEYWORDS, cache_size=CACHE_SIZE):
+        keywords = sorted({keyword_pattern(keyword) for keyword in keywords if keyword.strip()}, key=len, reverse=True)
+        self.pattern = re.compile(
+            r'(?P<mention>\[.*?\|)|(?P<close>\])'
+            + (r'|(?P<impediment>\b(?:' + '|'.join(keywords) + '))' if keywords else ''),
+            re.IGNORECASE,
+        )
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def analyze(self, body):
+        found = False
+
+        def replace(match):
+            nonlocal found
+            if match.lastgroup == 'impediment':
+                found = True
+                return match.group()
+            return ''
+
+        return ClassifiedComment(self.pattern.sub(replace, body or '').strip(), found)
+
+    def classify(self, comment):
+        key = (comment.id, comment.updated)
+        if comment.id is not None:
+            with self._lock:
+                result = self._cache.get(key)
+                if result is not None:
+                    self._cache.move_to_end(key)
+                    return result
+        result = self.analyze(comment.body)
+        if comment.id is not None:
+            with self._lock:
+                self._cache[key] = result
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def classify_batch(self, comments):
+        return [self.classify(comment) for comment in comments]
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier():
+    """Classificador do processo, com as palavras-chave de IMPEDIMENT_KEYWORDS (separadas por vírgula)."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            keywords = os.getenv('IMPEDIMENT_KEYWORDS')
+            _classifier = CommentClassifier(keywords.split(',') if keywords else DEFAULT_IMPEDIMENT_KEYWORDS)
+        return _classifier
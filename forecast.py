@@ -0,0 +1,81 @@
+import os
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import numpy as np
+
+DEFAULT_SIMULATIONS = 20000
+DEFAULT_SPRINT_DAYS = 14
+# Limite de sprints simulados por trajetória (~6 anos de sprints de 2 semanas)
+MAX_SPRINTS = 156
+PERCENTILES = (50, 85, 95)
+
+# Datas de conclusão por percentil; None quando o percentil passa do horizonte simulado
+Forecast = namedtuple('Forecast', ['p50', 'p85', 'p95', 'simulations', 'history_size'])
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def sprint_lengths(history):
+    """Duração em dias de cada sprint do histórico (padrão de 14 dias quando faltam as datas)."""
+    lengths = []
+    for stats in history:
+        start, end = _parse_date(stats.start_date), _parse_date(stats.end_date)
+        days = (end - start).total_seconds() / 86400 if start and end else 0
+        lengths.append(days if days > 0 else DEFAULT_SPRINT_DAYS)
+    return np.asarray(lengths, dtype=float)
+
+
+def simulate_days(throughputs, lengths, remaining, simulations=DEFAULT_SIMULATIONS, rng=None):
+    """Dias até concluir `remaining` tarefas em cada uma das simulações.
+
+    Cada trajetória sorteia sprints do histórico (vazão e duração juntas) até
+    acumular o trabalho restante. Tudo é calculado em matrizes de
+    simulações x sprints; trajetórias que não terminam no horizonte ficam com inf.
+    """
+    throughputs = np.asarray(throughputs, dtype=float)
+    lengths = np.asarray(lengths, dtype=float)
+    if remaining <= 0:
+        return np.zeros(simulations)
+    mean = throughputs.mean()
+    if mean <= 0:
+        return np.full(simulations, np.inf)
+
+    rng = rng or np.random.default_rng()
+    horizon = int(np.clip(np.ceil(3 * remaining / mean) + 1, 1, MAX_SPRINTS))
+    picks = rng.integers(0, len(throughputs), size=(simulations, horizon))
+
+    done = np.cumsum(throughputs[picks], axis=1) >= remaining
+    finished = done.any(axis=1)
+    sprint_index = done.argmax(axis=1)
+    elapsed = np.cumsum(lengths[picks], axis=1)
+    days = elapsed[np.arange(simulations), sprint_index]
+    days[~finished] = np.inf
+    return days
+
+
+def forecast_completion(history, remaining, simulations=None, start=None, rng=None):
+    """Previsão Monte Carlo (P50/P85/P95) a partir dos sprints fechados do board.
+
+    Retorna None quando não há histórico para simular.
+    """
+    if not history:
+        return None
+    simulations = simulations or int(os.getenv('FORECAST_SIMULATIONS', DEFAULT_SIMULATIONS))
+    if rng is None and os.getenv('FORECAST_SEED'):
+        rng = np.random.default_rng(int(os.getenv('FORECAST_SEED')))
+    throughputs = [stats.completed for stats in history]
+    days = simulate_days(throughputs, sprint_lengths(history), remaining, simulations, rng)
+
+    start = start or datetime.now()
+    # 'higher' devolve um valor simulado de fato (sem interpolar com inf)
+    values = np.percentile(days, PERCENTILES, method='higher')
+    dates = [start + timedelta(days=float(value)) if np.isfinite(value) else None for value in values]
+    return Forecast(*dates, simulations=simulations, history_size=len(history))
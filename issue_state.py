@@ -0,0 +1,311 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+
+from tenants import current_tenant
+from jira_search import SPRINT_FIELD, STORY_POINTS_FIELD, count_by_category, iter_issues, iter_raw_issues, to_record
+from issue_table import status_category
+
+# Todos os campos que algum job lê; o estado local guarda a união deles
+STATE_FIELDS = ('summary', 'status', 'assignee', 'created', 'updated', 'duedate', 'comment',
+                STORY_POINTS_FIELD, SPRINT_FIELD)
+
+# Depois desse intervalo o sprint é conferido de novo com uma busca completa no Jira
+DEFAULT_RECONCILE_INTERVAL = 6 * 3600
+
+# Depois desse intervalo sem sincronizar, a leitura busca antes as issues alteradas desde então
+DEFAULT_DELTA_INTERVAL = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issues (
+    tenant TEXT NOT NULL,
+    issue_id TEXT NOT NULL,
+    key TEXT,
+    updated TEXT,
+    raw TEXT NOT NULL,
+    PRIMARY KEY (tenant, issue_id)
+);
+CREATE TABLE IF NOT EXISTS issue_sprints (
+    tenant TEXT NOT NULL,
+    issue_id TEXT NOT NULL,
+    sprint_id INTEGER NOT NULL,
+    PRIMARY KEY (tenant, issue_id, sprint_id)
+);
+CREATE INDEX IF NOT EXISTS issue_sprints_sprint ON issue_sprints (tenant, sprint_id);
+CREATE TABLE IF NOT EXISTS sprint_sync (
+    tenant TEXT NOT NULL,
+    sprint_id INTEGER NOT NULL,
+    reconciled_at REAL NOT NULL,
+    PRIMARY KEY (tenant, sprint_id)
+);
+CREATE TABLE IF NOT EXISTS sprint_delta (
+    tenant TEXT NOT NULL,
+    sprint_id INTEGER NOT NULL,
+    synced_at REAL NOT NULL,
+    PRIMARY KEY (tenant, sprint_id)
+);
+"""
+
+
+def _complete_comments(jira, raw):
+    comment_field = raw.get('fields', {}).get('comment')
+    # A busca pode trazer só parte dos comentários
+    if comment_field and comment_field.get('total', 0) > len(comment_field.get('comments', [])):
+        raw['fields']['comment'] = jira._get_json(f"issue/{raw['key']}/comment", params={'maxResults': 5000})
+    return raw
+
+
+def _parse_updated(value):
+    """Data de atualização como datetime com fuso.
+
+    A API REST usa o fuso do usuário da API e o webhook o fuso do site: os
+    textos não podem ser comparados diretamente.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+    except ValueError:
+        return None
+
+
+def _sprint_ids(fields):
+    sprints = fields.get(SPRINT_FIELD) or []
+    return [sprint['id'] for sprint in sprints if isinstance(sprint, dict) and 'id' in sprint]
+
+
+class IssueState:
+    """Estado local (SQLite) das issues, mantido pelos webhooks do Jira.
+
+    Os eventos de issue, comentário e sprint são aplicados à medida que
+    chegam. Na hora do relatório, um sprint conferido há menos de
+    `reconcile_interval` segundos é lido daqui; caso contrário é feita uma
+    busca completa no Jira (reconciliação) antes da leitura. Entre as
+    reconciliações, uma consulta delta traz as issues alteradas desde a
+    última sincronização.
+    """
+
+    def __init__(self, path, reconcile_interval=DEFAULT_RECONCILE_INTERVAL, delta_interval=DEFAULT_DELTA_INTERVAL):
+        self.path = path
+        self.reconcile_interval = reconcile_interval
+        self.delta_interval = delta_interval
+        self._lock = threading.Lock()
+        self._sprint_locks = {}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _load_raw(self, conn, tenant, issue_id):
+        row = conn.execute('SELECT raw FROM issues WHERE tenant = ? AND issue_id = ?',
+                           (tenant, str(issue_id))).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store_raw(self, conn, tenant, raw, sprint_ids=None):
+        issue_id = str(raw['id'])
+        fields = raw.get('fields') or {}
+        conn.execute('INSERT OR REPLACE INTO issues (tenant, issue_id, key, updated, raw) VALUES (?, ?, ?, ?, ?)',
+                     (tenant, issue_id, raw.get('key'), fields.get('updated'), json.dumps(raw, ensure_ascii=False)))
+        if sprint_ids is None and SPRINT_FIELD in fields:
+            sprint_ids = _sprint_ids(fields)
+        if sprint_ids is not None:
+            conn.execute('DELETE FROM issue_sprints WHERE tenant = ? AND issue_id = ?', (tenant, issue_id))
+            conn.executemany('INSERT INTO issue_sprints (tenant, issue_id, sprint_id) VALUES (?, ?, ?)',
+                             [(tenant, issue_id, sprint_id) for sprint_id in sprint_ids])
+
+    # Eventos
+
+    def apply_event(self, tenant, payload):
+        """Aplica um evento de webhook do Jira. Retorna o nome do evento aplicado ou None."""
+        event = payload.get('webhookEvent', '')
+        with self._lock, closing(self._connect()) as conn:
+            with conn:
+                if event in ('jira:issue_created', 'jira:issue_updated'):
+                    self._apply_issue(conn, tenant, payload['issue'])
+                elif event == 'jira:issue_deleted':
+                    issue_id = str(payload['issue']['id'])
+                    conn.execute('DELETE FROM issues WHERE tenant = ? AND issue_id = ?', (tenant, issue_id))
+                    conn.execute('DELETE FROM issue_sprints WHERE tenant = ? AND issue_id = ?', (tenant, issue_id))
+                elif event in ('comment_created', 'comment_updated', 'comment_deleted'):
+                    self._apply_comment(conn, tenant, event, payload['issue'], payload['comment'])
+                elif event.startswith('sprint_'):
+                    # Início/fim de sprint move muitas issues: força uma reconciliação na próxima leitura
+                    conn.execute('DELETE FROM sprint_sync WHERE tenant = ? AND sprint_id = ?',
+                                 (tenant, payload['sprint']['id']))
+                else:
+                    logging.debug("Evento de webhook ignorado: %s", event)
+                    return None
+        logging.debug("Evento %s aplicado ao estado do tenant %s.", event, tenant)
+        return event
+
+    def _apply_issue(self, conn, tenant, issue):
+        stored = self._load_raw(conn, tenant, issue['id'])
+        fields = issue.get('fields') or {}
+        if stored is not None:
+            stored_updated = _parse_updated((stored.get('fields') or {}).get('updated'))
+            updated = _parse_updated(fields.get('updated'))
+            # Entregas fora de ordem: não sobrescreve uma versão mais nova
+            if stored_updated and updated and updated < stored_updated:
+                return
+            # O webhook nem sempre traz os comentários completos; mantém os já conhecidos
+            if 'comment' not in fields and 'comment' in stored.get('fields', {}):
+                fields['comment'] = stored['fields']['comment']
+        raw = {'id': str(issue['id']), 'key': issue.get('key'),
+               'fields': {name: fields.get(name) for name in STATE_FIELDS if name in fields}}
+        self._store_raw(conn, tenant, raw)
+
+    def _apply_comment(self, conn, tenant, event, issue, comment):
+        raw = self._load_raw(conn, tenant, issue['id'])
+        if raw is None:
+            # Issue ainda desconhecida: a reconciliação traz os comentários junto
+            return
+        comment_field = raw['fields'].setdefault('comment', {'comments': [], 'total': 0})
+        comments = [c for c in comment_field.get('comments', []) if str(c.get('id')) != str(comment['id'])]
+        if event != 'comment_deleted':
+            comments.append(comment)
+        comment_field['comments'] = comments
+        comment_field['total'] = len(comments)
+        self._store_raw(conn, tenant, raw)
+
+    # Leitura e reconciliação
+
+    def is_fresh(self, tenant, sprint_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT reconciled_at FROM sprint_sync WHERE tenant = ? AND sprint_id = ?',
+                               (tenant, sprint_id)).fetchone()
+        return row is not None and time.time() - row[0] < self.reconcile_interval
+
+    def reconcile_sprint(self, tenant, sprint_id, jira):
+        """Substitui as issues do sprint pelo resultado de uma busca completa no Jira."""
+        started = time.time()
+        raws = [_complete_comments(jira, raw) for raw in iter_raw_issues(f'sprint = {sprint_id}', STATE_FIELDS, jira=jira)]
+
+        with self._lock, closing(self._connect()) as conn:
+            with conn:
+                conn.execute('DELETE FROM issue_sprints WHERE tenant = ? AND sprint_id = ?', (tenant, sprint_id))
+                for raw in raws:
+                    self._store_raw(conn, tenant, raw)
+                    conn.execute('INSERT OR IGNORE INTO issue_sprints (tenant, issue_id, sprint_id) VALUES (?, ?, ?)',
+                                 (tenant, str(raw['id']), sprint_id))
+                conn.execute('INSERT OR REPLACE INTO sprint_sync (tenant, sprint_id, reconciled_at) VALUES (?, ?, ?)',
+                             (tenant, sprint_id, started))
+                conn.execute('INSERT OR REPLACE INTO sprint_delta (tenant, sprint_id, synced_at) VALUES (?, ?, ?)',
+                             (tenant, sprint_id, started))
+        logging.info("Sprint %s reconciliado com o Jira (%s issues).", sprint_id, len(raws))
+
+    def synced_at(self, tenant, sprint_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT synced_at FROM sprint_delta WHERE tenant = ? AND sprint_id = ?',
+                               (tenant, sprint_id)).fetchone()
+        return row[0] if row else 0
+
+    def refresh_sprint(self, tenant, sprint_id, jira):
+        """Busca só as issues do sprint alteradas desde a última sincronização (consulta delta).
+
+        Inclui as issues que estavam no sprint, para perceber as que saíram dele.
+        """
+        started = time.time()
+        # Duração relativa ("-Nm") não depende do fuso horário do usuário do Jira; arredonda para cima com folga
+        minutes = int((started - self.synced_at(tenant, sprint_id)) // 60) + 2
+        with closing(self._connect()) as conn:
+            known_ids = [row[0] for row in conn.execute(
+                'SELECT issue_id FROM issue_sprints WHERE tenant = ? AND sprint_id = ?', (tenant, sprint_id))]
+        scope = f'sprint = {sprint_id}' + (f' OR id in ({", ".join(known_ids)})' if known_ids else '')
+        jql = f'({scope}) AND updated >= -{minutes}m'
+        raws = [_complete_comments(jira, raw) for raw in iter_raw_issues(jql, STATE_FIELDS, jira=jira)]
+
+        with self._lock, closing(self._connect()) as conn:
+            with conn:
+                for raw in raws:
+                    self._store_raw(conn, tenant, raw)
+                conn.execute('INSERT OR REPLACE INTO sprint_delta (tenant, sprint_id, synced_at) VALUES (?, ?, ?)',
+                             (tenant, sprint_id, started))
+        logging.info("Sprint %s atualizado: %s issues alteradas nos últimos %s minutos.", sprint_id, len(raws), minutes)
+
+    def sync_sprint(self, tenant, sprint_id, jira):
+        """Deixa o sprint pronto para leitura: reconciliação completa ou apenas a consulta delta."""
+        with self._lock:
+            sprint_lock = self._sprint_locks.setdefault((tenant, sprint_id), threading.Lock())
+        # Vários jobs leem o mesmo sprint no mesmo horário: só um sincroniza
+        with sprint_lock:
+            if not self.is_fresh(tenant, sprint_id):
+                self.reconcile_sprint(tenant, sprint_id, jira)
+            elif time.time() - self.synced_at(tenant, sprint_id) > self.delta_interval:
+                self.refresh_sprint(tenant, sprint_id, jira)
+
+    def sprint_issues(self, tenant, sprint_id):
+        """JSON bruto das issues do sprint no estado local."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                'SELECT i.raw FROM issues i JOIN issue_sprints s ON s.tenant = i.tenant AND s.issue_id = i.issue_id '
+                'WHERE s.tenant = ? AND s.sprint_id = ? ORDER BY i.key',
+                (tenant, sprint_id),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_state():
+    """Estado local das issues, ou None se o receptor de webhooks não estiver em uso (ISSUE_STATE_DB)."""
+    global _state
+    path = os.getenv('ISSUE_STATE_DB')
+    if not path:
+        return None
+    with _state_lock:
+        if _state is None:
+            _state = IssueState(
+                path,
+                reconcile_interval=int(os.getenv('ISSUE_STATE_RECONCILE_INTERVAL', str(DEFAULT_RECONCILE_INTERVAL))),
+                delta_interval=int(os.getenv('ISSUE_STATE_DELTA_INTERVAL', str(DEFAULT_DELTA_INTERVAL))),
+            )
+        return _state
+
+
+def iter_sprint_issues(sprint_id, fields, jira=None, jql_filter=None, local_filter=None):
+    """Issues do sprint, do estado local quando disponível ou de uma busca no Jira.
+
+    `jql_filter` restringe a busca no Jira; `local_filter(record)` aplica a
+    mesma restrição sobre o estado local.
+    """
+    tenant = current_tenant()
+    jira = jira or tenant.jira
+    state = get_state()
+    if state is None:
+        jql = f'sprint = {sprint_id}' + (f' AND ({jql_filter})' if jql_filter else '')
+        yield from iter_issues(jql, fields, jira=jira)
+        return
+
+    state.sync_sprint(tenant.name, sprint_id, jira)
+    for raw in state.sprint_issues(tenant.name, sprint_id):
+        record = to_record(jira, raw)
+        if local_filter is None or local_filter(record):
+            yield record
+
+
+def sprint_category_counts(sprint_id, jira=None):
+    """Contagens do sprint por categoria de status, sem baixar as issues.
+
+    Com o estado local disponível a contagem é feita nele; caso contrário são
+    buscas com maxResults=0 no Jira.
+    """
+    if get_state() is None:
+        return count_by_category(f'sprint = {sprint_id}', jira=jira)
+    counts = {'new': 0, 'indeterminate': 0, 'done': 0}
+    for issue in iter_sprint_issues(sprint_id, ('status',), jira=jira):
+        category = status_category(issue.status, issue.status_category)
+        counts[category] = counts.get(category, 0) + 1
+    counts['total'] = sum(counts.values())
+    return counts
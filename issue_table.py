@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+JIRA_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+DISPLAY_DATE_FORMAT = '%d/%m/%Y'
+MISSING_DATE = 'Data não disponível'
+UNASSIGNED = 'Não atribuído'
+
+# Categorias de status do Jira: 'new' (a fazer), 'indeterminate' (em andamento) e 'done'.
+# Usado quando a busca não traz a categoria do status.
+STATUS_CATEGORY_BY_NAME = {
+    'done': 'done',
+    'concluído': 'done',
+    'concluido': 'done',
+    'in progress': 'indeterminate',
+    'em andamento': 'indeterminate',
+    'to do': 'new',
+    'a fazer': 'new',
+}
+
+
+def status_category(status, category=None):
+    """Categoria do status: a informada pelo Jira ou a deduzida pelo nome."""
+    if category:
+        return category
+    return STATUS_CATEGORY_BY_NAME.get((status or '').lower(), 'new')
+
+
+def _parse_datetimes(values):
+    return pd.to_datetime(pd.Series(values, dtype=object), format=JIRA_DATETIME_FORMAT, utc=True, errors='coerce')
+
+
+def _display_dates(values):
+    # A data exibida é a do próprio texto do Jira (no fuso de quem registrou), como antes
+    dates = pd.to_datetime(pd.Series(values, dtype=object).str.slice(0, 10), format='%Y-%m-%d', errors='coerce')
+    return dates, dates.dt.strftime(DISPLAY_DATE_FORMAT).fillna(MISSING_DATE)
+
+
+class IssueTable:
+    """Tabela colunar (pandas) com as issues de um snapshot.
+
+    As datas são convertidas uma única vez para datetime64, status e
+    responsável são categóricos, e atrasos, agrupamentos e percentuais são
+    calculados de forma vetorizada sobre o snapshot inteiro.
+    """
+
+    BASE_COLUMNS = ('key', 'summary', 'status', 'status_category', 'assignee', 'created', 'updated', 'duedate')
+
+    def __init__(self, frame):
+        self.frame = frame
+
+    def __len__(self):
+        return len(self.frame)
+
+    @classmethod
+    def from_issues(cls, issues, unassigned=UNASSIGNED, extra_columns=(), extra=None, today=None):
+        """Monta a tabela consumindo as issues uma a uma (apenas as colunas ficam em memória).
+
+        `extra(issue)` pode calcular colunas adicionais, na ordem de `extra_columns`.
+        """
+        columns = {name: [] for name in cls.BASE_COLUMNS + tuple(extra_columns)}
+        for issue in issues:
+            columns['key'].append(issue.key)
+            columns['summary'].append(issue.summary)
+            columns['status'].append(issue.status)
+            columns['status_category'].append(status_category(issue.status, issue.status_category))
+            columns['assignee'].append(issue.assignee or unassigned)
+            columns['created'].append(issue.created)
+            columns['updated'].append(issue.updated)
+            columns['duedate'].append(issue.duedate)
+            if extra_columns:
+                for name, value in zip(extra_columns, extra(issue)):
+                    columns[name].append(value)
+        return cls(cls._build_frame(columns, today))
+
+    @staticmethod
+    def _build_frame(columns, today=None):
+        today = pd.Timestamp(today).normalize() if today is not None else pd.Timestamp.now().normalize()
+        frame = pd.DataFrame({
+            'key': pd.Series(columns.pop('key'), dtype=object),
+            'summary': pd.Series(columns.pop('summary'), dtype=object),
+            'status': pd.Categorical(columns.pop('status')),
+            'status_category': pd.Categorical(columns.pop('status_category')),
+            'assignee': pd.Categorical(columns.pop('assignee')),
+        })
+        created = columns.pop('created')
+        updated = columns.pop('updated')
+        frame['created'] = _parse_datetimes(created)
+        frame['updated'] = _parse_datetimes(updated)
+        frame['created_date'] = _display_dates(created)[1]
+        frame['updated_date'] = _display_dates(updated)[1]
+
+        duedate, due_display = _display_dates(columns.pop('duedate'))
+        frame['duedate'] = duedate
+        frame['due_date'] = due_display
+        frame['overdue'] = (duedate < today).to_numpy()
+
+        for name, values in columns.items():
+            frame[name] = pd.Series(values, dtype=object)
+        return frame
+
+    def done_mask(self):
+        return (self.frame['status_category'] == 'done').to_numpy()
+
+    def in_progress_mask(self):
+        return (self.frame['status_category'] == 'indeterminate').to_numpy()
+
+    def status_mask(self, status):
+        return (self.frame['status'] == status).to_numpy()
+
+    def count(self, mask=None):
+        return int(len(self.frame) if mask is None else np.count_nonzero(mask))
+
+    def completion_percentage(self, mask=None):
+        """Percentual de issues concluídas (ou que atendem a `mask`)."""
+        total = len(self.frame)
+        if total == 0:
+            return 0.0
+        completed = self.count(self.done_mask() if mask is None else mask)
+        return completed / total * 100
+
+    def status_counts(self):
+        """Quantidade de issues por status, na ordem em que os status aparecem."""
+        return self.group_by('status').size()
+
+    def group_by(self, *columns):
+        """Agrupa na ordem em que os valores aparecem; com uma coluna, a chave é o próprio valor."""
+        keys = columns[0] if len(columns) == 1 else list(columns)
+        return self.frame.groupby(keys, observed=True, sort=False)
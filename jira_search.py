@@ -0,0 +1,113 @@
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from tenants import current_tenant
+
+# Registro enxuto de uma issue: só os campos pedidos na busca são preenchidos
+IssueRecord = namedtuple('IssueRecord', [
+    'id', 'key', 'summary', 'status', 'status_category', 'assignee', 'assignee_id',
+    'created', 'updated', 'duedate', 'comments', 'points', 'sprints',
+])
+
+CommentRecord = namedtuple('CommentRecord', ['id', 'body', 'updated'])
+
+PAGE_SIZE = 100
+
+# IDs fixos das categorias de status do Jira ('new' = a fazer, 'indeterminate' = em andamento)
+STATUS_CATEGORY_IDS = {'new': 2, 'indeterminate': 4, 'done': 3}
+
+# Campo customizado dos story points (varia entre sites do Jira)
+STORY_POINTS_FIELD = os.getenv('JIRA_STORY_POINTS_FIELD', 'customfield_10016')
+
+# Campo customizado com os sprints da issue (varia entre sites do Jira)
+SPRINT_FIELD = os.getenv('JIRA_SPRINT_FIELD', 'customfield_10020')
+
+
+def _comment_records(jira, key, comment_field):
+    comments = comment_field.get('comments', [])
+    # A busca pode trazer só parte dos comentários; nesse caso busca a lista completa
+    if comment_field.get('total', len(comments)) > len(comments):
+        comments = jira._get_json(f'issue/{key}/comment', params={'maxResults': 5000}).get('comments', [])
+    return [CommentRecord(c.get('id'), c.get('body') or '', c.get('updated')) for c in comments]
+
+
+def to_record(jira, raw):
+    """Converte o JSON de uma issue da busca em um IssueRecord."""
+    fields = raw.get('fields') or {}
+    status = fields.get('status') or {}
+    assignee = fields.get('assignee') or {}
+    comment_field = fields.get('comment')
+    return IssueRecord(
+        id=raw.get('id'),
+        key=raw.get('key'),
+        summary=fields.get('summary'),
+        status=status.get('name'),
+        status_category=(status.get('statusCategory') or {}).get('key'),
+        assignee=assignee.get('displayName'),
+        assignee_id=assignee.get('accountId'),
+        created=fields.get('created'),
+        updated=fields.get('updated'),
+        duedate=fields.get('duedate'),
+        comments=_comment_records(jira, raw.get('key'), comment_field) if comment_field is not None else None,
+        points=fields.get(STORY_POINTS_FIELD),
+        sprints=[sprint for sprint in fields.get(SPRINT_FIELD) or [] if isinstance(sprint, dict)]
+        if SPRINT_FIELD in fields else None,
+    )
+
+
+def iter_raw_issues(jql, fields, jira=None, page_size=PAGE_SIZE):
+    """Percorre o JSON bruto de todas as issues da busca, apenas com os campos informados."""
+    jira = jira or current_tenant().jira
+    start_at = 0
+    while True:
+        data = jira._get_json('search', params={
+            'jql': jql,
+            'fields': ','.join(fields),
+            'startAt': start_at,
+            'maxResults': page_size,
+        })
+        # Cada issue bruta é descartada assim que consumida
+        issues = deque(data.pop('issues', []))
+        page_length = len(issues)
+        while issues:
+            yield issues.popleft()
+        start_at += page_length
+        if not page_length or start_at >= data.get('total', 0):
+            break
+
+
+def iter_issues(jql, fields, jira=None, page_size=PAGE_SIZE):
+    """Percorre todas as issues da busca pedindo ao Jira apenas os campos informados."""
+    jira = jira or current_tenant().jira
+    for raw in iter_raw_issues(jql, fields, jira=jira, page_size=page_size):
+        yield to_record(jira, raw)
+
+
+def search_issues(jql, fields, jira=None):
+    """Lista com todas as issues da busca, apenas com os campos informados."""
+    return list(iter_issues(jql, fields, jira=jira))
+
+
+_count_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='jira-count')
+
+
+def count_issues(jql, jira=None):
+    """Quantidade de issues da busca, sem baixar nenhuma (maxResults=0)."""
+    jira = jira or current_tenant().jira
+    return jira._get_json('search', params={'jql': jql, 'maxResults': 0, 'fields': 'id'}).get('total', 0)
+
+
+def count_by_category(jql, jira=None):
+    """Quantidade de issues da busca por categoria de status, com as contagens feitas em paralelo.
+
+    Retorna {'new': n, 'indeterminate': n, 'done': n, 'total': n}. Use quando
+    só os números importam; para detalhes por issue, use `iter_issues`.
+    """
+    jira = jira or current_tenant().jira
+    futures = {
+        category: _count_pool.submit(count_issues, f'({jql}) AND statusCategory = {category_id}', jira)
+        for category, category_id in STATUS_CATEGORY_IDS.items()
+    }
+    counts = {category: future.result() for category, future in futures.items()}
+    counts['total'] = sum(counts.values())
+    return counts
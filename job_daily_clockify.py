@@ -1,22 +1,22 @@
 import requests
 import datetime
+import logging
 from collections import defaultdict
-from dotenv import load_dotenv
-import os
+from tenants import current_tenant, run_for_tenants
+from report_render import MessageBuilder, Template
+from metadata_cache import clockify_users
+from metrics_export import export_dataset
+from job_logging import HOT_LOGGER, setup_logging
 
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
+hot_log = logging.getLogger(HOT_LOGGER)
 
-# Configurações da API do Clockify
-CLOCKIFY_API_KEY = os.getenv('CLOCKIFY_API_KEY')
-CLOCKIFY_WORKSPACE_ID = os.getenv('CLOCKIFY_WORKSPACE_ID')
+# Configurações da API do Clockify (chave e workspace vêm do tenant atual)
 CLOCKIFY_BASE_URL = 'https://api.clockify.me/api/v1'
-CLOCKIFY_HEADERS = {
-    'X-Api-Key': CLOCKIFY_API_KEY
-}
 
-# Configuração do Webhook do Discord
-DISCORD_WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+HEADER_TEMPLATE = Template('# Relatório de Horas Trabalhadas por {user_name}\n**Período:** {start_date} - {end_date}\n\n')
+TASK_TEMPLATE = Template('- **{task}:** {hours:.2f} horas\n')
+DAY_TEMPLATE = Template('- {day}: {hours:.2f} horas\n')
+TOTAL_TEMPLATE = Template('**Total:** {hours:.2f} horas\n')
 
 # Função para converter duração (PTnHnMnS) em horas decimais
 def parse_duration(duration):
@@ -47,26 +47,29 @@ def get_time_entries(workspace_id, user_id, start_date, end_date):
         'start': start_date.isoformat() + 'Z',
         'end': end_date.isoformat() + 'Z'
     }
-    response = requests.get(url, headers=CLOCKIFY_HEADERS, params=params)
+    tenant = current_tenant()
+    response = tenant.session.get(url, headers=tenant.clockify_headers, params=params)
     
     if response.status_code == 200:
         data = response.json()
         return data if data is not None else []
     else:
-        print(f"Erro ao obter registros de tempo: {response.status_code} - {response.json()}")
+        logging.error("Erro ao obter registros de tempo: %s - %s", response.status_code, response.json())
         return []
 
 # Função para enviar mensagem para o Discord
 def send_to_discord(content):
     payload = {'content': content}
-    response = requests.post(DISCORD_WEBHOOK_URL, json=payload)
+    tenant = current_tenant()
+    response = tenant.session.post(tenant.webhook_url, json=payload)
     if response.status_code == 204:
-        print("Mensagem enviada para o Discord com sucesso.")
+        logging.info("Mensagem enviada para o Discord com sucesso.")
     else:
-        print(f"Erro ao enviar mensagem para o Discord: {response.status_code} - {response.text}")
+        logging.error("Erro ao enviar mensagem para o Discord: %s - %s", response.status_code, response.text)
 
 # Função principal
 def main():
+    tenant = current_tenant()
     # Define o intervalo de datas (última semana)
     end_date = datetime.datetime.utcnow()
     start_date = end_date - datetime.timedelta(days=7)
@@ -75,16 +78,14 @@ def main():
     start_date_str = start_date.strftime('%d/%m/%Y')
     end_date_str = end_date.strftime('%d/%m/%Y')
 
-    # Obtém a lista de usuários
-    users_url = f'{CLOCKIFY_BASE_URL}/workspaces/{CLOCKIFY_WORKSPACE_ID}/users'
-    users_response = requests.get(users_url, headers=CLOCKIFY_HEADERS)
-    if users_response.status_code == 200:
-        users = users_response.json()
-        if users is None:
-            print("Nenhum usuário retornado.")
-            return
-    else:
-        print(f"Erro ao obter usuários: {users_response.status_code} - {users_response.json()}")
+    # Obtém a lista de usuários (cache de metadados, muda pouco)
+    try:
+        users = clockify_users()
+    except requests.RequestException as e:
+        logging.error("Erro ao obter usuários: %s", e)
+        return
+    if not users:
+        logging.warning("Nenhum usuário retornado.")
         return
 
     # Inicializa um dicionário para armazenar horas trabalhadas e gastos por tarefa
@@ -93,23 +94,23 @@ def main():
 
     for user in users:
         if not isinstance(user, dict):
-            print("Formato inesperado para dados de usuário:", user)
+            logging.warning("Formato inesperado para dados de usuário: %s", user)
             continue
         user_id = user.get('id')
         user_name = user.get('name')
         if not user_id or not user_name:
-            print("Dados de usuário incompletos:", user)
+            logging.warning("Dados de usuário incompletos: %s", user)
             continue
         
         # Obtém registros de tempo do usuário
-        time_entries = get_time_entries(CLOCKIFY_WORKSPACE_ID, user_id, start_date, end_date)
+        time_entries = get_time_entries(tenant.clockify_workspace_id, user_id, start_date, end_date)
         for entry in time_entries:
             if not isinstance(entry, dict):
-                print("Formato inesperado para dados de registro de tempo:", entry)
+                logging.warning("Formato inesperado para dados de registro de tempo: %s", entry)
                 continue
 
             # Imprime a estrutura dos dados para verificar
-            print("Dados de entrada:", entry)
+            hot_log.debug("Dados de entrada: %s", entry)
             
             start_time = entry.get('timeInterval', {}).get('start')
             duration = entry.get('timeInterval', {}).get('duration')
@@ -117,7 +118,7 @@ def main():
             task_name = entry.get('task', {}).get('name', 'Sem Tarefa')
             
             if not start_time:
-                print("Registro de tempo sem data de início:", entry)
+                logging.warning("Registro de tempo sem data de início: %s", entry)
                 continue
             if duration is None:
                 duration = 'PT0H0M0S'
@@ -129,6 +130,16 @@ def main():
             # Adiciona as horas trabalhadas por tarefa
             task_hours[user_name][f'{project_name} - {task_name}'] += hours
 
+    # Horas por pessoa e tarefa e por pessoa e dia, para os dashboards
+    export_dataset('clockify_task_hours', [
+        {'user': user_name, 'task': task, 'hours': hours, 'start': start_date, 'end': end_date}
+        for user_name, tasks in task_hours.items() for task, hours in tasks.items()
+    ])
+    export_dataset('clockify_day_hours', [
+        {'user': user_name, 'day': day, 'hours': hours, 'start': start_date, 'end': end_date}
+        for user_name, days in user_hours.items() for day, hours in days.items()
+    ])
+
     # Ordena os usuários por ordem alfabética
     sorted_users = sorted(user_hours.keys())
 
@@ -136,29 +147,31 @@ def main():
     for user_name in sorted_users:
         hours = user_hours[user_name]
         tasks = task_hours[user_name]
-        markdown_content = f'# Relatório de Horas Trabalhadas por {user_name}\n'
-        markdown_content += f'**Período:** {start_date_str} - {end_date_str}\n\n'
+        builder = MessageBuilder()
+        HEADER_TEMPLATE.render_into(builder, user_name=user_name, start_date=start_date_str, end_date=end_date_str)
         
         # Adiciona horas por tarefa
         if tasks:
-            markdown_content += '## Horas por Tarefa\n'
+            builder.write('## Horas por Tarefa\n')
             for task, task_hours_value in tasks.items():
-                markdown_content += f'- **{task}:** {task_hours_value:.2f} horas\n'
-            markdown_content += '\n'
+                TASK_TEMPLATE.render_into(builder, task=task, hours=task_hours_value)
+            builder.write('\n')
         
         # Adiciona horas por dia da semana
-        markdown_content += '## Horas por Dia da Semana\n'
+        builder.write('## Horas por Dia da Semana\n')
         days_of_week = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
         
         total_hours = 0
         for day in days_of_week:
             day_hours = hours.get(day, 0)
             total_hours += day_hours
-            markdown_content += f'- {day}: {day_hours:.2f} horas\n'
-        markdown_content += f'**Total:** {total_hours:.2f} horas\n'
+            DAY_TEMPLATE.render_into(builder, day=day, hours=day_hours)
+        TOTAL_TEMPLATE.render_into(builder, hours=total_hours)
 
         # Envia o relatório para o Discord
-        send_to_discord(markdown_content)
+        for msg in builder.messages():
+            send_to_discord(msg)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    setup_logging(job='job_daily_clockify')
+    run_for_tenants(main)
\ No newline at end of file
@@ -1,137 +1,152 @@
-from jira import JIRA
+import re
+import logging
 import requests
-import json
-from dotenv import load_dotenv
-import os
-
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
-
-# Configurações do Jira
-# Configurações do Jira e Discord a partir das variáveis de ambiente
-jira_url = os.getenv('JIRA_URL')
-jira_username = os.getenv('JIRA_USERNAME')
-jira_api_token = os.getenv('JIRA_API_TOKEN')
-
-# Configurações do Clockify
-CLOCKIFY_API_KEY = os.getenv('CLOCKIFY_API_KEY')
-CLOCKIFY_WORKSPACE_ID = os.getenv('CLOCKIFY_WORKSPACE_ID')
-CLOCKIFY_BASE_URL = 'https://api.clockify.me/api/v1'
-CLOCKIFY_HEADERS = {
-    'X-Api-Key': CLOCKIFY_API_KEY
-}
-
-# Configuração do Webhook do Discord
-DISCORD_WEBHOOK_URL = os.getenv('WEBHOOK_URL')
-
-# Autenticação e conexão com o Jira
-jira = JIRA(basic_auth=(jira_username, jira_api_token), options={'server': jira_url})
-
-# Obter o primeiro board disponível
-def obter_primeiro_board():
-    boards = jira.boards()
-    if boards:
-        return boards[0]
-    return None
+from collections import defaultdict
+from datetime import datetime, timezone
+from tenants import current_tenant, run_for_tenants
+from issue_state import iter_sprint_issues
+from metadata_cache import clockify_projects, jira_boards
+from job_logging import setup_logging
+
+# Configurações do Clockify (chave e workspace vêm do tenant atual)
+CLOCKIFY_REPORTS_URL = 'https://reports.api.clockify.me/v1'
+REPORT_PAGE_SIZE = 1000
+
+# Chaves de issue do Jira citadas no nome da tarefa ou na descrição do registro (ex.: PROJ-123)
+ISSUE_KEY_PATTERN = re.compile(r'\b[A-Z][A-Z0-9_]+-\d+\b')
+
+# Campos das issues usados no cruzamento
+ISSUE_FIELDS = ('summary',)
+
+SPRINT_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f%z'
+
 
 # Obter sprint ativo
-def obter_sprint_ativo(board_id):
+def obter_sprint_ativo(jira, board_id):
     sprints = jira.sprints(board_id)
     for sprint in sprints:
         if sprint.state == 'active':
             return sprint
     return None
 
-# Obter tarefas do sprint ativo
-def obter_tarefas_do_sprint(sprint_id):
-    jql = f'sprint={sprint_id}'
-    issues = jira.search_issues(jql)
-    return issues
 
-# Listar projetos do Clockify
+# Obter as tarefas dos sprints ativos de todos os boards, indexadas pela chave
+def obter_tarefas_dos_sprints(jira):
+    tarefas = {}
+    inicio, fim = None, None
+    for board in jira_boards():
+        sprint = obter_sprint_ativo(jira, board.id)
+        if not sprint:
+            continue
+        logging.info('Board %s (ID: %s): sprint ativo %s', board.name, board.id, sprint.name)
+        sprint_inicio = datetime.strptime(sprint.startDate, SPRINT_DATE_FORMAT)
+        sprint_fim = datetime.strptime(sprint.endDate, SPRINT_DATE_FORMAT)
+        inicio = sprint_inicio if inicio is None else min(inicio, sprint_inicio)
+        fim = sprint_fim if fim is None else max(fim, sprint_fim)
+        for tarefa in iter_sprint_issues(sprint.id, ISSUE_FIELDS, jira=jira):
+            tarefas[tarefa.key] = {'summary': tarefa.summary, 'board': board.name}
+    return tarefas, inicio, fim
+
+
+# Listar projetos do Clockify (cache de metadados, muda pouco)
 def listar_projetos_clockify():
-    url = f'https://api.clockify.me/api/v1/workspaces/{CLOCKIFY_WORKSPACE_ID}/projects'
-    headers = {'X-Api-Key': CLOCKIFY_API_KEY}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        projects = json.loads(response.text)
-        return projects
-    else:
-        print(f'Erro ao buscar projetos no Clockify: {response.status_code} - {response.text}')
+    try:
+        return clockify_projects()
+    except requests.RequestException as e:
+        logging.error('Erro ao buscar projetos no Clockify: %s', e)
         return []
 
-# Selecionar o primeiro projeto do Clockify
-def selecionar_primeiro_projeto_clockify():
-    projetos = listar_projetos_clockify()
-    if projetos:
-        return projetos[0]['id']
-    else:
+
+# Obter todos os registros de tempo do workspace no período (relatório detalhado paginado)
+def obter_registros_de_tempo(inicio, fim):
+    tenant = current_tenant()
+    url = f'{CLOCKIFY_REPORTS_URL}/workspaces/{tenant.clockify_workspace_id}/reports/detailed'
+    page = 1
+    while True:
+        body = {
+            'dateRangeStart': inicio.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'dateRangeEnd': fim.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'detailedFilter': {'page': page, 'pageSize': REPORT_PAGE_SIZE},
+        }
+        response = tenant.session.post(url, headers=tenant.clockify_headers, json=body)
+        # Uma página faltando deixaria as horas menores do que são: a execução falha
+        response.raise_for_status()
+        entries = response.json().get('timeentries', [])
+        yield from entries
+        if len(entries) < REPORT_PAGE_SIZE:
+            return
+        page += 1
+
+
+def indexar_por_resumo(tarefas):
+    """Índice nome normalizado -> chave, para tarefas do Clockify criadas com o resumo da issue."""
+    return {tarefa['summary'].strip().lower(): chave for chave, tarefa in tarefas.items() if tarefa['summary']}
+
+
+def chaves_do_registro(entry, tarefas, indice_resumo):
+    """Chaves de issue do sprint citadas no nome da tarefa ou na descrição do registro."""
+    task_name = entry.get('taskName') or ''
+    texto = f"{task_name} {entry.get('description') or ''}"
+    chaves = {chave for chave in ISSUE_KEY_PATTERN.findall(texto) if chave in tarefas}
+    if not chaves and task_name.strip().lower() in indice_resumo:
+        chaves.add(indice_resumo[task_name.strip().lower()])
+    return chaves
+
+
+# Cruzar os registros do Clockify com as issues do Jira em memória
+def cruzar_horas(tarefas, registros, projetos=None):
+    nomes_projetos = {projeto['id']: projeto['name'] for projeto in projetos or []}
+    indice_resumo = indexar_por_resumo(tarefas)
+    horas_por_tarefa = defaultdict(lambda: defaultdict(float))
+    horas_por_pessoa = defaultdict(float)
+    horas_por_projeto = defaultdict(float)
+    horas_sem_tarefa = defaultdict(float)
+
+    for entry in registros:
+        # No relatório detalhado a duração vem em segundos
+        horas = (entry.get('timeInterval', {}).get('duration') or 0) / 3600
+        pessoa = entry.get('userName') or entry.get('userId')
+        projeto = entry.get('projectName') or nomes_projetos.get(entry.get('projectId'), 'Sem Projeto')
+        horas_por_projeto[projeto] += horas
+
+        chaves = chaves_do_registro(entry, tarefas, indice_resumo)
+        if not chaves:
+            horas_sem_tarefa[pessoa] += horas
+            continue
+        horas_por_pessoa[pessoa] += horas
+        # Registro que cita várias issues tem as horas divididas entre elas
+        for chave in chaves:
+            horas_por_tarefa[chave][pessoa] += horas / len(chaves)
+
+    return {
+        'por_tarefa': horas_por_tarefa,
+        'por_pessoa': horas_por_pessoa,
+        'por_projeto': horas_por_projeto,
+        'sem_tarefa': horas_sem_tarefa,
+    }
+
+
+def main():
+    jira = current_tenant().jira
+    tarefas, inicio, fim = obter_tarefas_dos_sprints(jira)
+    if not tarefas:
+        logging.info('Nenhum sprint ativo encontrado.')
         return None
 
-# Obter horas trabalhadas por pessoa em uma tarefa do Clockify
-def obter_horas_trabalhadas_por_tarefa(task_id, project_id):
-    url = f'https://api.clockify.me/api/v1/workspaces/{CLOCKIFY_WORKSPACE_ID}/projects/{project_id}/tasks/{task_id}/time-entries'
-    headers = {'X-Api-Key': CLOCKIFY_API_KEY}
-    response = requests.get(url, headers=headers)
-    if response.status_code == 200:
-        time_entries = json.loads(response.text)
-    else:
-        print(f'Erro ao buscar entradas de tempo no Clockify: {response.status_code} - {response.text}')
-        return {}
-
-    horas_por_pessoa = {}
-    for entry in time_entries:
-        user_id = entry['userId']
-        duration = entry['timeInterval']['duration']  # Em ISO 8601 duration format
-        hours = parse_iso8601_duration(duration)
-        if user_id in horas_por_pessoa:
-            horas_por_pessoa[user_id] += hours
-        else:
-            horas_por_pessoa[user_id] = hours
-    return horas_por_pessoa
-
-# Função para converter duração ISO 8601 para horas
-def parse_iso8601_duration(duration):
-    # Assumindo que a duração está no formato PTnHnMnS (apenas horas, minutos e segundos)
-    hours = 0
-    minutes = 0
-    seconds = 0
-    if 'H' in duration:
-        hours = int(duration.split('H')[0].replace('PT', ''))
-        duration = duration.split('H')[1]
-    if 'M' in duration:
-        minutes = int(duration.split('M')[0])
-        duration = duration.split('M')[1]
-    if 'S' in duration:
-        seconds = int(duration.replace('S', ''))
-    return hours + minutes / 60 + seconds / 3600
-
-# Obter primeiro board disponível
-board = obter_primeiro_board()
-if not board:
-    print('Nenhum board encontrado.')
-else:
-    print(f'Board encontrado: {board.name} (ID: {board.id})')
-
-    # Obter sprint ativo
-    sprint_ativo = obter_sprint_ativo(board.id)
-    if sprint_ativo:
-        print(f'Sprint ativo: {sprint_ativo.name}')
-
-        # Obter tarefas do sprint ativo
-        tarefas = obter_tarefas_do_sprint(sprint_ativo.id)
-        
-        # Selecionar primeiro projeto do Clockify
-        project_id = selecionar_primeiro_projeto_clockify()
-        if not project_id:
-            print('Nenhum projeto encontrado no Clockify.')
-        else:
-            for tarefa in tarefas:
-                task_id = tarefa.key
-                horas_por_pessoa = obter_horas_trabalhadas_por_tarefa(task_id, project_id)
-                
-                print(f'Tarefa: {task_id}')
-                for user_id, horas in horas_por_pessoa.items():
-                    print(f'  Usuário: {user_id}, Horas trabalhadas: {horas:.2f}')
-    else:
-        print('Nenhum sprint ativo encontrado.')
\ No newline at end of file
+    fim = min(fim, datetime.now(timezone.utc))
+    horas = cruzar_horas(tarefas, obter_registros_de_tempo(inicio, fim), listar_projetos_clockify())
+
+    for chave, tarefa in tarefas.items():
+        logging.info("Tarefa: %s (%s) - %s", chave, tarefa['board'], tarefa['summary'])
+        for pessoa, total in horas['por_tarefa'].get(chave, {}).items():
+            logging.info('  Usuário: %s, Horas trabalhadas: %.2f', pessoa, total)
+
+    logging.info('Horas por pessoa nas tarefas do sprint:')
+    for pessoa, total in sorted(horas['por_pessoa'].items()):
+        logging.info('  %s: %.2f horas (sem tarefa do sprint: %.2f)', pessoa, total, horas["sem_tarefa"].get(pessoa, 0))
+    return horas
+
+
+if __name__ == '__main__':
+    setup_logging(job='job_jira_clockify')
+    run_for_tenants(main)
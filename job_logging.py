@@ -0,0 +1,149 @@
+import atexit
+import contextvars
+import copy
+import itertools
+import json
+import logging
+import os
+import queue
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Logger dos caminhos quentes (por issue, por comentário, por data).
+# Fica em DEBUG e, mesmo com LOG_LEVEL=DEBUG, só 1 a cada LOG_HOT_SAMPLE_EVERY registros é gravado.
+HOT_LOGGER = 'jobs.hot'
+
+_job = contextvars.ContextVar('log_job', default=None)
+_board = contextvars.ContextVar('log_board', default=None)
+_tenant = contextvars.ContextVar('log_tenant', default=None)
+_run_id = contextvars.ContextVar('log_run_id', default=None)
+
+# Valores usados quando o contexto não foi definido (ex.: job rodando via __main__)
+_defaults = {'job': None, 'run_id': uuid.uuid4().hex[:12]}
+_listener = None
+
+
+def new_run_id():
+    return uuid.uuid4().hex[:12]
+
+
+def current_context():
+    """Job e run_id do contexto atual (os mesmos anexados aos logs)."""
+    return _job.get() or _defaults['job'], _run_id.get() or _defaults['run_id']
+
+
+@contextmanager
+def log_context(job=None, board=None, tenant=None, run_id=None):
+    """Anexa job/board/tenant/run_id aos registros de log emitidos dentro do bloco."""
+    tokens = []
+    for var, value in ((_job, job), (_board, board), (_tenant, tenant), (_run_id, run_id)):
+        if value is not None:
+            tokens.append((var, var.set(value)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copia o contexto da thread que gerou o log para o registro, antes de ir para a fila."""
+
+    def filter(self, record):
+        record.job = _job.get() or _defaults['job']
+        record.board = _board.get()
+        record.tenant = _tenant.get()
+        record.run_id = _run_id.get() or _defaults['run_id']
+        return True
+
+
+class SampleFilter(logging.Filter):
+    """Deixa passar apenas 1 a cada `every` registros."""
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = max(1, int(every))
+        self._counter = itertools.count()
+
+    def filter(self, record):
+        return next(self._counter) % self.every == 0
+
+
+class JsonQueueHandler(QueueHandler):
+    """QueueHandler que mantém o traceback separado da mensagem.
+
+    O `prepare` padrão junta o traceback ao texto e descarta o exc_info; aqui
+    ele é formatado em `exc_text`, que o JsonFormatter grava no campo 'exc'.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg = record.message
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro."""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for field in ('job', 'board', 'tenant', 'run_id'):
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def setup_logging(job=None):
+    """Configura o log de todos os jobs: fila + thread de escrita, JSON e rotação por tamanho.
+
+    Variáveis: LOG_LEVEL (padrão INFO), LOG_FILE (padrão tracking.log),
+    LOG_MAX_BYTES, LOG_BACKUP_COUNT e LOG_HOT_SAMPLE_EVERY.
+    """
+    global _listener
+    if job:
+        _defaults['job'] = job
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter()
+    file_handler = RotatingFileHandler(
+        os.getenv('LOG_FILE', 'tracking.log'),
+        maxBytes=int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024))),
+        backupCount=int(os.getenv('LOG_BACKUP_COUNT', '5')),
+        encoding='utf-8',
+    )
+    file_handler.setFormatter(formatter)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    # As threads dos jobs só colocam o registro na fila; a escrita fica com o listener
+    log_queue = queue.SimpleQueue()
+    queue_handler = JsonQueueHandler(log_queue)
+    queue_handler.addFilter(ContextFilter())
+    _listener = QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+
+    hot = logging.getLogger(HOT_LOGGER)
+    hot.addFilter(SampleFilter(os.getenv('LOG_HOT_SAMPLE_EVERY', '100')))
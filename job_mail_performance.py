@@ -1,28 +1,30 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-from jira import JIRA
+from matplotlib.figure import Figure
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import io
 import base64
 import logging
-import os
-from pprint import pprint
-# Configuração do logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+from tenants import current_tenant, run_for_tenants
+from sprint_history import sprint_stats
+from metadata_cache import jira_boards
+from job_logging import HOT_LOGGER, setup_logging
+
+hot_log = logging.getLogger(HOT_LOGGER)
 
 # Função para buscar todos os sprints de um board
 def get_board_sprints(jira, board_id):
-    logging.info(f"Buscando sprints para o board {board_id}...")
-    sprints = jira.sprints(board_id, state='active,future,closed')
-    logging.info(f"Encontrados {len(sprints)} sprints para o board {board_id}.")
+    logging.info("Buscando sprints para o board %s...", board_id)
+    # Sprints futuros ainda não têm performance
+    sprints = jira.sprints(board_id, state='active,closed')
+    logging.info("Encontrados %s sprints para o board %s.", len(sprints), board_id)
     return sprints
 
 # Função para buscar todos os boards e sprints
 def get_all_sprints(jira):
     logging.info("Buscando todos os boards no Jira...")
-    boards = jira.boards()
+    boards = jira_boards()
     all_sprints = []
     
     for board in boards:
@@ -33,38 +35,36 @@ def get_all_sprints(jira):
                 'sprint': sprint
             })
     
-    logging.info(f"Total de sprints encontrados: {len(all_sprints)}.")
+    logging.info("Total de sprints encontrados: %s.", len(all_sprints))
     return all_sprints
 
-# Função para buscar a performance de um sprint específico
-def get_sprint_performance(jira, sprint_id):
-    logging.info(f"Buscando performance para o sprint {sprint_id}...")
-    issues = jira.search_issues(f'sprint = {sprint_id}', maxResults=False)
-    completed = sum(1 for issue in issues if issue.fields.status.name == 'Done')
-    total = len(issues)
-    logging.info(f"Performance do sprint {sprint_id}: {completed}/{total} tarefas concluídas.")
-    return completed, total
-
-# Função para obter os e-mails dos desenvolvedores a partir das issues
-def get_developer_emails(jira, issues):
-    logging.info("Extraindo e-mails dos desenvolvedores das issues...")
+# Função para buscar a performance de um sprint específico.
+# Sprints fechados vêm do histórico materializado; só o ativo é consultado no Jira.
+def get_sprint_performance(board_id, sprint):
+    logging.info("Buscando performance para o sprint %s...", sprint.id)
+    stats, developers = sprint_stats(board_id, sprint)
+    logging.info("Performance do sprint %s: %s/%s tarefas concluídas.", sprint.id, stats.completed, stats.committed)
+    return stats.completed, stats.committed, developers
+
+# Função para obter os e-mails dos desenvolvedores do sprint
+def get_developer_emails(jira, developers):
+    logging.info("Extraindo e-mails dos desenvolvedores do sprint...")
     emails = {}
-    for issue in issues:
-        assignee = issue.fields.assignee
-        if assignee:
-            user_key = assignee.accountId            
+    for developer in developers:
+        user_key = developer.developer_id
+        if user_key:
             try:
                 email = user_key+'@gmail.com'
                 user = jira.user(user_key)
-                pprint (user.__dict__)
+                hot_log.debug("Dados do usuário %s: %s", user_key, user.raw)
 #                email = user.emailAddress if hasattr(user, 'emailAddress') else None
                 if email:
                     if email not in emails:
                         emails[email] = []
-                    emails[email].append(issue)
+                    emails[email].append(developer)
             except Exception as e:
-                logging.error(f"Erro ao buscar informações do usuário {user_key}: {e}")
-    logging.info(f"E-mails extraídos: {list(emails.keys())}")
+                logging.error("Erro ao buscar informações do usuário %s: %s", user_key, e)
+    logging.info("E-mails extraídos: %s", list(emails.keys()))
     return emails
 
 # Função para criar uma mensagem personalizada com base na evolução
@@ -89,23 +89,18 @@ def send_email(from_email, to_email, subject, html_body):
     msg['Subject'] = subject
     msg.attach(MIMEText(html_body, 'html'))
 
-    logging.info(f"Enviando e-mail para {to_email}...")
+    logging.info("Enviando e-mail para %s...", to_email)
     server = smtplib.SMTP('smtp.seu_provedor.com', 587)
     server.starttls()
     server.login(from_email, 'sua_senha_de_email')
     server.sendmail(from_email, to_email, msg.as_string())
     server.quit()
-    logging.info(f"E-mail enviado para {to_email} com sucesso.")
+    logging.info("E-mail enviado para %s com sucesso.", to_email)
 
 # Função principal
 def main():
-    # Configurações do Jira
-    jira_url = os.getenv('JIRA_URL')
-    jira_username = os.getenv('JIRA_USERNAME')
-    jira_api_token = os.getenv('JIRA_API_TOKEN')
-    logging.info("Conectando ao Jira...")
-    jira = JIRA(basic_auth=(jira_username, jira_api_token), options={'server': jira_url})
-    logging.info("Conexão com Jira estabelecida.")
+    # Cliente do Jira do tenant atual
+    jira = current_tenant().jira
 
     # Buscar todos os sprints
     all_sprints = get_all_sprints(jira)
@@ -115,14 +110,14 @@ def main():
     for item in all_sprints:
         board = item['board']
         sprint = item['sprint']
-        completed, total = get_sprint_performance(jira, sprint.id)
+        completed, total, developers = get_sprint_performance(board.id, sprint)
         performance_data.append((board.name, sprint.name, completed, total))
-        issues = jira.search_issues(f'sprint = {sprint.id}', maxResults=False)
-        sprint_emails = get_developer_emails(jira, issues)
-        for email, user_issues in sprint_emails.items():
+        sprint_emails = get_developer_emails(jira, developers)
+        # Guarda os sprints em que cada desenvolvedor teve tarefas
+        for email in sprint_emails:
             if email not in all_emails:
-                all_emails[email] = []
-            all_emails[email].extend(user_issues)
+                all_emails[email] = set()
+            all_emails[email].add(sprint.name)
 
     # Criando um DataFrame com os dados
     logging.info("Criando DataFrame com os dados coletados...")
@@ -131,20 +126,21 @@ def main():
 
     # Gerando o gráfico de linha
     logging.info("Gerando gráfico de linha da performance...")
-    plt.figure(figsize=(10, 6))
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
     for board_name in df['Board'].unique():
         board_data = df[df['Board'] == board_name]
-        plt.plot(board_data['Sprint'], board_data['Percentual'], marker='o', linestyle='-', label=board_name)
+        ax.plot(board_data['Sprint'], board_data['Percentual'], marker='o', linestyle='-', label=board_name)
 
-    plt.title('Evolução da Performance por Board')
-    plt.xlabel('Sprint')
-    plt.ylabel('Percentual de Conclusão (%)')
-    plt.ylim(0, 100)
-    plt.legend(title='Board')
+    ax.set_title('Evolução da Performance por Board')
+    ax.set_xlabel('Sprint')
+    ax.set_ylabel('Percentual de Conclusão (%)')
+    ax.set_ylim(0, 100)
+    ax.legend(title='Board')
 
     # Salvar o gráfico em um buffer de memória
     buf = io.BytesIO()
-    plt.savefig(buf, format='png')
+    fig.savefig(buf, format='png')
     buf.seek(0)
     image_base64 = base64.b64encode(buf.read()).decode('utf-8')
     buf.close()
@@ -156,8 +152,8 @@ def main():
     logging.info("Preparando e enviando e-mails individualmente...")
     from_email = "seu_email@example.com"
 
-    for email, user_issues in all_emails.items():
-        user_df = df[df['Sprint'].isin([issue.fields.sprint.name for issue in user_issues])]
+    for email, user_sprints in all_emails.items():
+        user_df = df[df['Sprint'].isin(user_sprints)]
         personalized_message = create_personalized_message(user_df)
 
         html_body = f"""
@@ -179,11 +175,12 @@ def main():
         </body>
         </html>
         """
-        print(html_body)  # Imprimir o HTML para debug, removido ou substituído na produção
+        logging.debug("%s", html_body)  # HTML para debug, removido ou substituído na produção
         #send_email(from_email, email, "Comparativo de Performance nos Sprints", html_body)
 
     logging.info("Todos os e-mails foram enviados com sucesso!")
 
 # Executar a função principal
 if __name__ == "__main__":
-    main()
+    setup_logging(job='job_mail_performance')
+    run_for_tenants(main)
@@ -1,79 +1,70 @@
-import os
-import numpy as np
-import matplotlib.pyplot as plt
-import requests
-from jira import JIRA
-from datetime import datetime, timedelta
-import io
-from dotenv import load_dotenv
-
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
-
-# Configurações do Jira e Discord a partir das variáveis de ambiente
-jira_url = os.getenv('JIRA_URL')
-jira_username = os.getenv('JIRA_USERNAME')
-jira_api_token = os.getenv('JIRA_API_TOKEN')
-webhook_url = os.getenv('WEBHOOK_URL')
-
-# Conectar ao Jira
-jira = JIRA(basic_auth=(jira_username, jira_api_token), options={'server': jira_url})
+import logging
+from tenants import current_tenant, run_for_tenants
+from jira_search import count_issues
+from sprint_history import closed_sprint_stats, sprint_counts
+from forecast import forecast_completion
+from checkpoints import get_checkpoints
+from metrics_export import export_dataset
+from selection import project_selected
+from sharding import shard_items
+from metadata_cache import jira_boards, jira_statuses
+from job_logging import setup_logging
 
 # Função para listar todos os status disponíveis no Jira
 def list_statuses():
-    statuses = jira.statuses()
+    statuses = jira_statuses()
     for status in statuses:
-        print(f"Status: {status.name}")
+        logging.info("Status: %s", status.name)
 
-def get_velocity(sprints):
-    total_completed_tasks = 0
-    total_sprints = len(sprints)
-    for sprint in sprints:
-        if sprint.state == 'closed':
-            jql_query = f'sprint = {sprint.id} AND status = "Done"'  # Ajustar o status aqui se necessário
-            issues = jira.search_issues(jql_query, maxResults=False)
-            total_completed_tasks += len(issues)
-    return total_completed_tasks / total_sprints if total_sprints > 0 else 0
+def get_velocity(board_id, sprints):
+    """Média de tarefas concluídas por sprint fechado, lida do histórico materializado."""
+    history = closed_sprint_stats(board_id, sprints)
+    total_completed_tasks = sum(stats.completed for stats in history)
+    return total_completed_tasks / len(history) if history else 0.0
 
 def get_remaining_work(project_key):
-    jql_query = f'project = {project_key} AND status != "Done"'  # Ajustar o status aqui se necessário
-    issues = jira.search_issues(jql_query, maxResults=False)
-    remaining_work = len(issues)
-    return remaining_work
+    jira = current_tenant().jira
+    jql_query = f'project = {project_key} AND statusCategory != Done'
+    return count_issues(jql_query, jira=jira)
 
-def get_project_statistics(board_id, completed_status, in_progress_status):
-    sprints = jira.sprints(board_id)
+def get_project_statistics(board_id, sprints):
+    # Sprints fechados vêm do histórico; só o sprint ativo é consultado no Jira
     total_issues = 0
     completed_issues = 0
     pending_issues = 0
 
     for sprint in sprints:
         if sprint.state in ['active', 'closed']:
-            jql_query = f'sprint = {sprint.id}'
-            issues = jira.search_issues(jql_query, maxResults=False)
-            total_issues += len(issues)
-            completed_issues += sum(1 for issue in issues if issue.fields.status.name == completed_status)
-            pending_issues += sum(1 for issue in issues if issue.fields.status.name == in_progress_status)
+            # Só as contagens importam aqui: o sprint ativo é contado sem baixar as issues
+            stats = sprint_counts(board_id, sprint)
+            total_issues += stats.committed
+            completed_issues += stats.completed
+            pending_issues += stats.in_progress
 
     not_started_issues = total_issues - completed_issues - pending_issues
-    completed_percentage = (completed_issues / total_issues) * 100 if total_issues > 0 else 0
+    completed_percentage = (completed_issues / total_issues) * 100 if total_issues > 0 else 0.0
     return completed_issues, pending_issues, not_started_issues, completed_percentage
 
-def estimate_completion_date(velocity, remaining_work):
-    if velocity <= 0:
-        return "Velocidade é zero ou negativa, não é possível estimar a conclusão."
-    
-    estimated_sprints = remaining_work / velocity
-    today = datetime.now()
-    estimated_completion_date = today + timedelta(weeks=int(estimated_sprints * 2))  # Supondo sprints de 2 semanas
-    return estimated_completion_date.strftime('%d/%m/%Y')
+def estimate_completion(board_id, sprints, remaining_work):
+    """Previsão de conclusão (P50/P85/P95) por simulação Monte Carlo dos sprints fechados."""
+    return forecast_completion(closed_sprint_stats(board_id, sprints), remaining_work)
+
+def format_completion_date(forecast):
+    """Faixa de datas de conclusão da previsão, para o texto do Discord."""
+    if forecast is None:
+        return "Sem sprints fechados, não é possível estimar a conclusão."
+    if forecast.p50 is None:
+        return "Vazão dos sprints fechados é zero ou baixa demais, não é possível estimar a conclusão."
+
+    def format_date(date):
+        return date.strftime('%d/%m/%Y') if date else 'além do horizonte simulado'
 
-def send_report_to_discord(project_key, velocity, remaining_work, completion_date, completed_issues, pending_issues, not_started_issues, completed_percentage):
-    if webhook_url is None:
-        print(f"Erro: URL do webhook do Discord não está configurada.")
-        return None
+    return (f"P50 {format_date(forecast.p50)} · P85 {format_date(forecast.p85)} · "
+            f"P95 {format_date(forecast.p95)} ({forecast.simulations} simulações, "
+            f"{forecast.history_size} sprints fechados)")
 
-    content = (
+def build_report_content(project_key, velocity, remaining_work, completion_date, completed_issues, pending_issues, not_started_issues, completed_percentage):
+    return (
         f"**Relatório de Projeção de Conclusão do Projeto: {project_key}**\n\n"
         f"**Velocidade da Equipe:** {velocity:.2f} tarefas por sprint\n"
         f"**Trabalho Restante:** {remaining_work} tarefas\n"
@@ -84,54 +75,95 @@ def send_report_to_discord(project_key, velocity, remaining_work, completion_dat
         f"**Percentual Concluído:** {completed_percentage:.2f}%\n"
     )
 
+def send_report_to_discord(content, board_id=None):
+    """Envia o relatório; erros de HTTP são propagados para o checkpoint não marcar a entrega."""
+    tenant = current_tenant()
+    webhook_url = tenant.webhook_for(board_id)
     data = {
         'content': content
     }
-    try:
-        response = requests.post(webhook_url, data=data)
-        response.raise_for_status()
-        return response
-    except requests.RequestException as e:
-        print(f"Erro ao enviar relatório para o Discord: {e}")
-        return None
+    response = tenant.session.post(webhook_url, data=data)
+    response.raise_for_status()
+    logging.info("Status Code: %s", response.status_code)
+    logging.info("Resposta do Discord: %s", response.text)
+    return response
 
 def get_board_id_for_project(project_key):
-    boards = jira.boards()
+    boards = jira_boards()
     for board in boards:
         if board.location.projectKey == project_key:
             return board.id
     return None
 
+def process_project(project_key):
+    jira = current_tenant().jira
+    checkpoint = get_checkpoints().run('job_resume_project').board(project_key)
+    if checkpoint.completed:
+        logging.info("Relatório do projeto %s já entregue hoje; pulando.", project_key)
+        return
+
+    board_id = get_board_id_for_project(project_key)
+    if not board_id:
+        logging.warning("Nenhum board encontrado para o projeto %s", project_key)
+        # Nada a enviar: o projeto não deixa a execução do dia incompleta
+        checkpoint.complete()
+        return
+    if current_tenant().webhook_for(board_id) is None:
+        logging.error("Erro: URL do webhook do Discord não está configurada.")
+        return
+
+    def compute():
+        sprints = jira.sprints(board_id)
+        checkpoint.fetched({'board_id': board_id, 'sprints': len(sprints)})
+
+        velocity = get_velocity(board_id, sprints)
+        remaining_work = get_remaining_work(project_key)
+        completed_issues, pending_issues, not_started_issues, completed_percentage = get_project_statistics(board_id, sprints)
+        forecast = estimate_completion(board_id, sprints, remaining_work)
+        completion_date = format_completion_date(forecast)
+
+        def forecast_date(name):
+            date = getattr(forecast, name) if forecast is not None else None
+            return date.date() if date is not None else None
+
+        export_dataset('project_summary', [{
+            'project_key': project_key, 'velocity': velocity, 'remaining_work': remaining_work,
+            'completed_issues': completed_issues, 'pending_issues': pending_issues,
+            'not_started_issues': not_started_issues, 'completed_percentage': completed_percentage,
+            'p50': forecast_date('p50'), 'p85': forecast_date('p85'), 'p95': forecast_date('p95'),
+            'simulations': forecast.simulations if forecast is not None else None,
+            'history_size': forecast.history_size if forecast is not None else 0,
+        }], board_id=board_id)
+        return [build_report_content(project_key, velocity, remaining_work, completion_date, completed_issues,
+                                     pending_issues, not_started_issues, completed_percentage)]
+
+    messages = checkpoint.computed(compute)
+    # Enviar o relatório para o Discord
+    checkpoint.deliver(messages, lambda content: send_report_to_discord(content, board_id))
+    checkpoint.complete()
+
+def process_projects(project_keys):
+    """Processa os projetos; os que falharem ficam fora do resultado (não são marcados como concluídos)."""
+    results = {}
+    for project_key in project_keys:
+        try:
+            results[project_key] = process_project(project_key)
+        except Exception as e:
+            logging.error("Erro ao processar o projeto %s: %s", project_key, e)
+    return results
+
 def main():
+    jira = current_tenant().jira
     projects = jira.projects()
     
     # Listar todos os status disponíveis no Jira para ajustar o status correto
     list_statuses()
 
-    # Ajuste os nomes dos status conforme necessário
-    completed_status = "Done"  # Exemplo de status concluído
-    in_progress_status = "In Progress"  # Exemplo de status em andamento
-
-    for project in projects:
-        project_key = project.key
-        board_id = get_board_id_for_project(project_key)
-        
-        if not board_id:
-            print(f"Nenhum board encontrado para o projeto {project_key}")
-            continue
-
-        sprints = jira.sprints(board_id)
-
-        velocity = get_velocity(sprints)
-        remaining_work = get_remaining_work(project_key)
-        completed_issues, pending_issues, not_started_issues, completed_percentage = get_project_statistics(board_id, completed_status, in_progress_status)
-        completion_date = estimate_completion_date(velocity, remaining_work)
-
-        # Enviar o relatório para o Discord
-        response = send_report_to_discord(project_key, velocity, remaining_work, completion_date, completed_issues, pending_issues, not_started_issues, completed_percentage)
-        if response:
-            print(f"Status Code: {response.status_code}")
-            print(f"Resposta do Discord: {response.text}")
+    # No modo de várias réplicas, cada uma processa apenas os seus projetos
+    project_keys = [project.key for project in projects if project_selected(project.key)]
+    get_checkpoints().run('job_resume_project').expect(project_keys)
+    shard_items(current_tenant().name, 'job_resume_project', project_keys, process_projects)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    setup_logging(job='job_resume_project')
+    run_for_tenants(main)
\ No newline at end of file
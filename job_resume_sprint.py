@@ -1,151 +1,122 @@
-from jira import JIRA
-import os
 from datetime import datetime
-import requests
-import matplotlib.pyplot as plt
-from dotenv import load_dotenv
-
-# Carregar variáveis de ambiente do arquivo .env
-load_dotenv()
-
-jira_url = os.getenv('JIRA_URL')
-jira_username = os.getenv('JIRA_USERNAME')
-jira_api_token = os.getenv('JIRA_API_TOKEN')
-webhook_url = os.getenv('WEBHOOK_URL')
-
-# Autenticar no Jira
-jira = JIRA(basic_auth=(jira_username, jira_api_token), options={'server': jira_url})
-
-def format_date(date_str):
-    """Formata a data no formato dd/mm/yyyy, retorna 'Data não disponível' se a data for inválida."""
-    try:
-        return datetime.strptime(date_str, '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%d/%m/%Y')
-    except ValueError:
-        return 'Data não disponível'
+import logging
+from matplotlib.figure import Figure
+from tenants import current_tenant, map_boards, run_for_tenants
+from issue_state import iter_sprint_issues
+from issue_table import IssueTable
+from metadata_cache import jira_boards
+from job_logging import setup_logging
+from metrics_export import export_dataset
+from report_render import MessageBuilder, Template, bundle_posts, figure_attachment, send_posts
+from job_resume_sprint_burndown import burndown_attachment
+
+# Campos das issues usados no relatório
+ISSUE_FIELDS = ('summary', 'status', 'assignee', 'created', 'updated')
+
+SUMMARY_TEMPLATE = Template(
+    "# Relatório Diário: {sprint_name} ({start_date} - {end_date})\n\n"
+    "**Total de Tarefas:** {total_tasks}\n"
+    "**Tarefas Concluídas:** {completed_tasks}\n"
+    "**Percentual Concluído:** {completion_percentage:.2f}%\n"
+    "**Tarefas Restantes:** {remaining_tasks}\n\n"
+    "# Tarefas por Status e Pessoa:\n"
+)
+STATUS_TEMPLATE = Template("\n ## {status}: \n")
+ASSIGNEE_TEMPLATE = Template("\n**{assignee}:**\n")
+TASK_TEMPLATE = Template("- **{key}**: {summary} (Criado em: {created}, Atualizado em: {updated})\n")
+
+# Colunas das tarefas do sprint exportadas para os dashboards
+EXPORT_COLUMNS = ['key', 'summary', 'status', 'status_category', 'assignee', 'created', 'updated']
+
+def status_chart(table):
+    """Gráfico de barras com a quantidade de tarefas por status."""
+    status_counts = table.status_counts()
+
+    # Figure em vez de pyplot: os jobs rodam em paralelo no pool do scheduler
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.bar(list(status_counts.index), status_counts.tolist(), color=['blue', 'orange', 'green'])
+    ax.set_xlabel('Status')
+    ax.set_ylabel('Número de Tarefas')
+    ax.set_title('Quantidade de Tarefas por Status')
+    ax.grid(axis='y')
+    return figure_attachment(fig, 'task_counts.png')
 
 def process_board(board_id):
-    try:
-        # Obter os sprints do board específico
-        sprints = jira.sprints(board_id)
-
-        # Encontrar o sprint ativo
-        sprint_id = None
-        for sprint in sprints:
-            if sprint.state == 'active':
-                sprint_id = sprint.id
-                sprint_name = sprint.name
-                sprint_start_date = datetime.strptime(sprint.startDate, '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%d/%m/%Y')
-                sprint_end_date = datetime.strptime(sprint.endDate, '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%d/%m/%Y')
-                break
-
-        if sprint_id:
-            # Buscar todas as tarefas do sprint ativo
-            jql_query = f'sprint = {sprint_id}'
-            issues = jira.search_issues(jql_query)
-
-            # Organizar tarefas por status e depois por pessoa atribuída
-            tasks_by_status_and_assignee = {}
-            total_tasks = len(issues)
-            completed_tasks = 0
-
-            for issue in issues:
-                status = issue.fields.status.name
-                assignee = issue.fields.assignee.displayName if issue.fields.assignee else "Não atribuído"
-                created_date = datetime.strptime(issue.fields.created, '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%d/%m/%Y')
-                updated_date = datetime.strptime(issue.fields.updated, '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%d/%m/%Y')
-
-                if status not in tasks_by_status_and_assignee:
-                    tasks_by_status_and_assignee[status] = {}
-
-                if assignee not in tasks_by_status_and_assignee[status]:
-                    tasks_by_status_and_assignee[status][assignee] = []
-
-                tasks_by_status_and_assignee[status][assignee].append(
-                    f"- **{issue.key}**: {issue.fields.summary} (Criado em: {created_date}, Atualizado em: {updated_date})"
-                )
-
-                if status == 'Concluído':  # Verifique o status que indica conclusão
-                    completed_tasks += 1
-
-            # Calcular o percentual concluído
-            completion_percentage = (completed_tasks / total_tasks) * 100 if total_tasks > 0 else 0
-            remaining_tasks = total_tasks - completed_tasks
-
-            # Gerar e salvar o gráfico
-            statuses = list(tasks_by_status_and_assignee.keys())
-            task_counts = [len(tasks) for tasks in tasks_by_status_and_assignee.values()]
-
-            plt.figure(figsize=(10, 6))
-            plt.bar(statuses, task_counts, color=['blue', 'orange', 'green'])
-            plt.xlabel('Status')
-            plt.ylabel('Número de Tarefas')
-            plt.title('Quantidade de Tarefas por Status')
-            plt.grid(axis='y')
-
-            # Salvar o gráfico como uma imagem
-            plt.savefig('task_counts.png')
-            plt.close()  # Fechar a figura para liberar memória
-
-            # Construir o conteúdo da mensagem
-            content = (
-                f"# Relatório Diário: {sprint_name} ({sprint_start_date} - {sprint_end_date})\n\n"
-                f"**Total de Tarefas:** {total_tasks}\n"
-                f"**Tarefas Concluídas:** {completed_tasks}\n"
-                f"**Percentual Concluído:** {completion_percentage:.2f}%\n"
-                f"**Tarefas Restantes:** {remaining_tasks}\n\n"
-                "# Tarefas por Status e Pessoa:\n"
-            )
-            
-            text_data = {'content': content}
-            text_response = requests.post(webhook_url, json=text_data)
-
-            print(f"Status Code do Texto: {text_response.status_code}")
-            print(f"Resposta do Discord do Texto: {text_response.text}")
-
-            for status, assignees in tasks_by_status_and_assignee.items():
-                content = ""
-                content += f"\n ## {status}: \n"
-                for assignee, tasks in assignees.items():
-                    content += f"\n**{assignee}:**\n"
-                    content += "\n".join(tasks)
-                    content += "\n"
-                text_data = {'content': content}
-                text_response = requests.post(webhook_url, json=text_data)
-
-            print(f"Status Code do Texto: {text_response.status_code}")
-            print(f"Resposta do Discord do Texto: {text_response.text}")
-
-
-            # Enviar a mensagem de texto para o Discord
-            
-            # Enviar a imagem para o Discord
-            with open('task_counts.png', 'rb') as file:
-                image_data = {
-                    'content': '# Gráfico das tarefas por status:'
-                }
-                image_files = {
-                    'file': ('task_counts.png', file, 'image/png')
-                }
-                image_response = requests.post(webhook_url, data=image_data, files=image_files)
-                print(f"Status Code da Imagem: {image_response.status_code}")
-                print(f"Resposta do Discord da Imagem: {image_response.text}")
-
-        else:
-            print("Nenhum sprint ativo encontrado.")
-    except Exception as e:
-        print(f"Ocorreu um erro ao processar o board {board_id}: {e}")
+    tenant = current_tenant()
+    jira = tenant.jira
+    webhook_url = tenant.webhook_for(board_id)
+    # Erros sobem para o map_boards, que registra a falha sem marcar o board como concluído
+
+    # Obter os sprints do board específico
+    sprints = jira.sprints(board_id)
+
+    # Encontrar o sprint ativo
+    active = next((sprint for sprint in sprints if sprint.state == 'active'), None)
+
+    if active:
+        sprint_start_date = datetime.strptime(active.startDate, '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%d/%m/%Y')
+        sprint_end_date = datetime.strptime(active.endDate, '%Y-%m-%dT%H:%M:%S.%f%z').strftime('%d/%m/%Y')
+
+        # Buscar todas as tarefas do sprint ativo (do estado local, se houver)
+        # As issues são consumidas uma a uma; só as colunas da tabela ficam em memória
+        table = IssueTable.from_issues(iter_sprint_issues(active.id, ISSUE_FIELDS, jira=jira))
+
+        # Conclusão pela categoria do status no Jira, não pelo nome do status
+        total_tasks = len(table)
+        completed_tasks = table.count(table.done_mask())
+        completion_percentage = table.completion_percentage()
+        remaining_tasks = total_tasks - completed_tasks
+
+        export_dataset('sprint_summary', [{
+            'sprint_id': active.id, 'sprint_name': active.name, 'total_tasks': total_tasks,
+            'completed_tasks': completed_tasks, 'completion_percentage': completion_percentage,
+            'remaining_tasks': remaining_tasks,
+        }], board_id=board_id)
+        export_dataset('sprint_tasks', table.frame[EXPORT_COLUMNS].assign(sprint_id=active.id), board_id=board_id)
+
+        # Gráficos em memória, enviados junto com o texto: barras por status e burndown
+        charts = [status_chart(table), burndown_attachment(active, total_tasks, completed_tasks)]
+
+        # Construir o conteúdo da mensagem
+        builder = MessageBuilder()
+        SUMMARY_TEMPLATE.render_into(
+            builder,
+            sprint_name=active.name,
+            start_date=sprint_start_date,
+            end_date=sprint_end_date,
+            total_tasks=total_tasks,
+            completed_tasks=completed_tasks,
+            completion_percentage=completion_percentage,
+            remaining_tasks=remaining_tasks,
+        )
+
+        # Tarefas por status e depois por pessoa atribuída
+        for status, status_tasks in table.group_by('status'):
+            STATUS_TEMPLATE.render_into(builder, status=status)
+            for assignee, tasks in status_tasks.groupby('assignee', observed=True, sort=False):
+                ASSIGNEE_TEMPLATE.render_into(builder, assignee=assignee)
+                for task in tasks.itertuples(index=False):
+                    TASK_TEMPLATE.render_into(builder, key=task.key, summary=task.summary,
+                                              created=task.created_date, updated=task.updated_date)
+
+        # Texto e gráficos no menor número de posts: os gráficos vão com a primeira mensagem
+        send_posts(tenant.session, webhook_url, bundle_posts(builder.messages(), charts))
+
+    else:
+        logging.info("Nenhum sprint ativo encontrado.")
 
 def main():
     try:
         # Obter todos os boards
-        boards = jira.boards()
+        boards = jira_boards()
 
         # Processar cada board
-        for board in boards:
-            process_board(board.id)
+        map_boards(process_board, [board.id for board in boards])
 
     except Exception as e:
-        print(f"Ocorreu um erro: {e}")
+        logging.error("Ocorreu um erro: %s", e)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    setup_logging(job='job_resume_sprint')
+    run_for_tenants(main)
\ No newline at end of file
@@ -0,0 +1,171 @@
+import json
+import logging
+import os
+import threading
+import time
+from types import SimpleNamespace
+from tenants import current_tenant
+from selection import board_selected
+
+CLOCKIFY_BASE_URL = 'https://api.clockify.me/api/v1'
+
+# TTL padrão (segundos) por tipo de metadado; sobrescreva com METADATA_TTL_<TIPO>
+DEFAULT_TTLS = {
+    'jira_boards': 6 * 3600,
+    'jira_statuses': 24 * 3600,
+    'clockify_users': 24 * 3600,
+    'clockify_projects': 24 * 3600,
+}
+
+# Acima dessa idade o valor antigo não é mais servido enquanto revalida
+DEFAULT_MAX_STALE = 7 * 24 * 3600
+
+
+class MetadataCache:
+    """Cache em disco de metadados que mudam pouco (boards, status, usuários, projetos).
+
+    Valores dentro do TTL são servidos direto do cache. Valores vencidos são
+    servidos enquanto uma thread em segundo plano busca a versão nova
+    (stale-while-revalidate). Sem valor em cache, a busca é feita na hora.
+    Os valores precisam ser serializáveis em JSON.
+    """
+
+    def __init__(self, directory, ttls=None, max_stale=DEFAULT_MAX_STALE):
+        self.directory = directory
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.max_stale = max_stale
+        self._memory = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def ttl(self, kind):
+        return int(os.getenv(f'METADATA_TTL_{kind.upper()}', self.ttls.get(kind, 3600)))
+
+    def _path(self, kind, key):
+        safe_key = ''.join(c if c.isalnum() or c in '-_.' else '_' for c in str(key))
+        return os.path.join(self.directory, f'{kind}__{safe_key}.json')
+
+    def _read(self, kind, key):
+        entry = self._memory.get((kind, key))
+        if entry is not None:
+            return entry
+        try:
+            with open(self._path(kind, key), encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        self._memory[(kind, key)] = entry
+        return entry
+
+    def _write(self, kind, key, value):
+        entry = {'stored_at': time.time(), 'value': value}
+        path = self._path(kind, key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(entry, file)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._memory[(kind, key)] = entry
+        return entry
+
+    def _refresh_in_background(self, kind, key, loader):
+        with self._lock:
+            if (kind, key) in self._refreshing:
+                return
+            self._refreshing.add((kind, key))
+
+        def refresh():
+            try:
+                self._write(kind, key, loader())
+                logging.info("Metadado %s (%s) revalidado.", kind, key)
+            except Exception as e:
+                logging.error("Erro ao revalidar o metadado %s (%s): %s", kind, key, e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard((kind, key))
+
+        threading.Thread(target=refresh, name=f'metadata-{kind}', daemon=True).start()
+
+    def get(self, kind, key, loader):
+        entry = self._read(kind, key)
+        if entry is not None:
+            age = time.time() - entry['stored_at']
+            if age <= self.ttl(kind):
+                return entry['value']
+            if age <= self.max_stale:
+                self._refresh_in_background(kind, key, loader)
+                return entry['value']
+        return self._write(kind, key, loader())['value']
+
+    def invalidate(self, kind=None, key=None):
+        """Remove do cache um metadado, todos de um tipo ou todos (sem argumentos)."""
+        with self._lock:
+            for cached_kind, cached_key in list(self._memory):
+                if kind in (None, cached_kind) and key in (None, cached_key):
+                    del self._memory[(cached_kind, cached_key)]
+        prefix = f'{kind}__' if kind else ''
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json') or not name.startswith(prefix):
+                continue
+            if key is not None and name != os.path.basename(self._path(kind, key)):
+                continue
+            os.remove(os.path.join(self.directory, name))
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = MetadataCache(os.getenv('METADATA_CACHE_DIR', os.path.join('.cache', 'metadata')))
+        return _cache
+
+
+def _as_objects(value):
+    """Converte o JSON em objetos com acesso por atributo, como os recursos do Jira."""
+    return json.loads(json.dumps(value), object_hook=lambda d: SimpleNamespace(**d))
+
+
+def jira_boards():
+    """Boards do Jira do tenant atual (board.id, board.name, board.location...).
+
+    Apenas os boards selecionados para a execução (ver selection.py) são retornados.
+    """
+    tenant = current_tenant()
+    value = get_cache().get('jira_boards', tenant.name, lambda: [board.raw for board in tenant.jira.boards()])
+    return [board for board in _as_objects(value) if board_selected(board)]
+
+
+def jira_statuses():
+    """Status do Jira do tenant atual (status.name, status.statusCategory...)."""
+    tenant = current_tenant()
+    value = get_cache().get('jira_statuses', tenant.name, lambda: [status.raw for status in tenant.jira.statuses()])
+    return _as_objects(value)
+
+
+def _clockify_list(path):
+    tenant = current_tenant()
+
+    def load():
+        url = f'{CLOCKIFY_BASE_URL}/workspaces/{tenant.clockify_workspace_id}/{path}'
+        response = tenant.session.get(url, headers=tenant.clockify_headers, params={'page-size': 5000})
+        response.raise_for_status()
+        return response.json() or []
+
+    return load
+
+
+def clockify_users():
+    """Usuários do workspace do Clockify do tenant atual (lista de dicts da API)."""
+    tenant = current_tenant()
+    return get_cache().get('clockify_users', tenant.name, _clockify_list('users'))
+
+
+def clockify_projects():
+    """Projetos do workspace do Clockify do tenant atual (lista de dicts da API)."""
+    tenant = current_tenant()
+    return get_cache().get('clockify_projects', tenant.name, _clockify_list('projects'))
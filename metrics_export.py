@@ -0,0 +1,169 @@
+import logging
+import os
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs
+import pyarrow.ipc
+import pyarrow.parquet as pq
+from tenants import current_tenant
+from job_logging import current_context
+
+# Partição usada pelos conjuntos que não são por board (ex.: horas do Clockify)
+ALL_BOARDS = 'all'
+
+# Extensão e formato do pyarrow.dataset de cada formato de exportação
+FORMATS = {'parquet': ('parquet', 'parquet'), 'arrow': ('arrow', 'ipc')}
+
+PARTITION_FIELDS = [('date', pa.string()), ('board', pa.string())]
+PARTITIONING = ds.partitioning(pa.schema(PARTITION_FIELDS), flavor='hive')
+
+# Colunas acrescentadas a todas as linhas exportadas
+RUN_FIELDS = [('tenant', pa.string()), ('job', pa.string()), ('run_id', pa.string()), ('exported_at', pa.float64())]
+
+_UTC = pa.timestamp('us', tz='UTC')
+_TASK_FIELDS = [
+    ('key', pa.string()), ('summary', pa.string()), ('status', pa.string()), ('status_category', pa.string()),
+    ('assignee', pa.string()), ('created', _UTC), ('updated', _UTC),
+]
+
+# Esquema fixo de cada conjunto: todas as execuções gravam os mesmos tipos,
+# mesmo quando os valores de uma execução são inteiros, vazios ou nulos
+SCHEMAS = {name: pa.schema(fields + RUN_FIELDS) for name, fields in {
+    'daily_tasks': _TASK_FIELDS + [
+        ('bucket', pa.string()), ('duedate', pa.timestamp('us')), ('overdue', pa.bool_()),
+        ('comments', pa.string()), ('impediments', pa.string()), ('sprint_id', pa.int64()),
+    ],
+    'sprint_tasks': _TASK_FIELDS + [('sprint_id', pa.int64())],
+    'sprint_summary': [
+        ('sprint_id', pa.int64()), ('sprint_name', pa.string()), ('total_tasks', pa.int64()),
+        ('completed_tasks', pa.int64()), ('completion_percentage', pa.float64()), ('remaining_tasks', pa.int64()),
+    ],
+    'project_summary': [
+        ('project_key', pa.string()), ('velocity', pa.float64()), ('remaining_work', pa.int64()),
+        ('completed_issues', pa.int64()), ('pending_issues', pa.int64()), ('not_started_issues', pa.int64()),
+        ('completed_percentage', pa.float64()), ('p50', pa.date32()), ('p85', pa.date32()), ('p95', pa.date32()),
+        ('simulations', pa.int64()), ('history_size', pa.int64()),
+    ],
+    'clockify_task_hours': [
+        ('user', pa.string()), ('task', pa.string()), ('hours', pa.float64()),
+        ('start', pa.timestamp('us')), ('end', pa.timestamp('us')),
+    ],
+    'clockify_day_hours': [
+        ('user', pa.string()), ('day', pa.string()), ('hours', pa.float64()),
+        ('start', pa.timestamp('us')), ('end', pa.timestamp('us')),
+    ],
+}.items()}
+
+
+def export_dir():
+    return os.getenv('METRICS_EXPORT_DIR')
+
+
+def export_format():
+    value = os.getenv('METRICS_EXPORT_FORMAT', 'parquet').lower()
+    if value not in FORMATS:
+        raise ValueError(f"METRICS_EXPORT_FORMAT inválido: {value} (use {', '.join(FORMATS)})")
+    return value
+
+
+def _to_table(rows, schema):
+    """Converte as linhas para o esquema do conjunto (colunas ausentes ficam nulas)."""
+    if isinstance(rows, pd.DataFrame):
+        table = pa.Table.from_pandas(rows, preserve_index=False)
+    else:
+        table = pa.Table.from_pylist([row._asdict() if hasattr(row, '_asdict') else dict(row) for row in rows])
+    data_fields = [field for field in schema if field.name not in dict(RUN_FIELDS)]
+    unknown = set(table.column_names) - {field.name for field in data_fields}
+    if unknown:
+        raise ValueError(f"Colunas fora do esquema: {', '.join(sorted(unknown))}")
+    # Categóricas viram texto e inteiros viram float quando o esquema pede
+    return pa.Table.from_arrays(
+        [table[field.name].cast(field.type) if field.name in table.column_names
+         else pa.nulls(table.num_rows, field.type) for field in data_fields],
+        schema=pa.schema(data_fields),
+    )
+
+
+def export_dataset(dataset, rows, board_id=None, date=None):
+    """Grava as linhas calculadas na execução em um arquivo colunar novo.
+
+    O arquivo fica em <METRICS_EXPORT_DIR>/<dataset>/date=<AAAA-MM-DD>/board=<id>/,
+    e cada execução acrescenta um arquivo (part-<run_id>-...) sem reescrever
+    os anteriores. `rows` é um DataFrame ou uma lista de namedtuples/dicts,
+    convertidos para o esquema do conjunto em SCHEMAS.
+    Sem METRICS_EXPORT_DIR nada é gravado. Falhas são só registradas no log:
+    a exportação não impede o envio dos relatórios.
+    """
+    directory = export_dir()
+    if not directory:
+        return None
+    try:
+        schema = SCHEMAS[dataset]
+        table = _to_table(rows, schema)
+        if not table.num_rows:
+            return None
+        job, run_id = current_context()
+        run_values = {'tenant': current_tenant().name, 'job': job, 'run_id': run_id, 'exported_at': time.time()}
+        for name, type_ in RUN_FIELDS:
+            table = table.append_column(name, pa.array([run_values[name]] * table.num_rows, type_))
+        table = table.cast(schema)
+
+        extension, _ = FORMATS[export_format()]
+        partition = os.path.join(directory, dataset,
+                                 f"date={date or datetime.now().strftime('%Y-%m-%d')}",
+                                 f"board={ALL_BOARDS if board_id is None else board_id}")
+        os.makedirs(partition, exist_ok=True)
+        name = f'part-{run_id}-{uuid.uuid4().hex[:8]}.{extension}'
+        path = os.path.join(partition, name)
+
+        # Grava em um temporário oculto e renomeia: leitores nunca veem um arquivo pela metade
+        temp_path = os.path.join(partition, f'.{name}.tmp')
+        if extension == 'parquet':
+            pq.write_table(table, temp_path, compression='zstd')
+        else:
+            # Arrow IPC sem compressão, para leitura com memory-map sem cópia
+            with pa.OSFile(temp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(temp_path, path)
+        logging.info("%s linhas de %s exportadas para %s.", table.num_rows, dataset, path)
+        return path
+    except Exception as e:
+        logging.error("Erro ao exportar %s: %s", dataset, e)
+        return None
+
+
+def load_dataset(dataset, boards=None, since=None, until=None, columns=None, directory=None):
+    """Lê o histórico exportado de um conjunto como DataFrame, sem chamar nenhuma API.
+
+    `boards` filtra pelas partições de board; `since`/`until` (AAAA-MM-DD)
+    pelas de data. Os arquivos são lidos com memory-map.
+    """
+    directory = directory or export_dir()
+    path = os.path.join(directory, dataset)
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns or [])
+    extension, file_format = FORMATS[export_format()]
+    # Só os arquivos do formato configurado; temporários (ocultos) ficam de fora
+    files = sorted(os.path.join(root, name) for root, _, names in os.walk(path)
+                   for name in names if name.endswith(f'.{extension}') and not name.startswith('.'))
+    if not files:
+        return pd.DataFrame(columns=columns or [])
+    # O esquema declarado vale para todos os arquivos, inclusive os de execuções antigas
+    schema = pa.schema(list(SCHEMAS[dataset]) + [pa.field(name, type_) for name, type_ in PARTITION_FIELDS])
+    dataset = ds.dataset(files, schema=schema, format=file_format, partitioning=PARTITIONING,
+                         partition_base_dir=path, filesystem=pyarrow.fs.LocalFileSystem(use_mmap=True))
+
+    condition = None
+    for expression in (
+        ds.field('board').isin([str(board) for board in boards]) if boards is not None else None,
+        ds.field('date') >= since if since else None,
+        ds.field('date') <= until if until else None,
+    ):
+        if expression is not None:
+            condition = expression if condition is None else condition & expression
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
@@ -0,0 +1,50 @@
+import logging
+import os
+
+from tenants import current_tenant, map_boards
+from issue_state import get_state
+from metadata_cache import clockify_projects, clockify_users, jira_boards, jira_statuses
+from sprint_history import closed_sprint_stats
+
+# Estado local usado pelo pré-aquecimento quando ISSUE_STATE_DB não foi definido
+DEFAULT_STATE_DB = os.path.join('.cache', 'issue_state.sqlite3')
+
+
+def enable_state():
+    """Garante o estado local das issues, onde os dados pré-aquecidos ficam guardados."""
+    os.environ.setdefault('ISSUE_STATE_DB', DEFAULT_STATE_DB)
+    return get_state()
+
+
+def prewarm_board(board_id):
+    tenant = current_tenant()
+    state = get_state()
+    sprints = tenant.jira.sprints(board_id)
+    # Sprints fechados vão para o histórico; o ativo é baixado inteiro para o estado local
+    closed_sprint_stats(board_id, sprints)
+    for sprint in sprints:
+        if sprint.state == 'active':
+            state.reconcile_sprint(tenant.name, sprint.id, tenant.jira)
+
+
+def main():
+    """Busca antes do horário dos relatórios as issues e os metadados que eles vão ler.
+
+    No horário, as issues dos sprints ativos só passam pela consulta delta
+    (alteradas desde o pré-aquecimento). Continuam sendo feitas no horário a
+    lista de sprints de cada board, a de projetos, as contagens por categoria
+    dos sprints ativos no `job_resume_project` e as entradas de tempo do
+    Clockify por usuário.
+    """
+    tenant = current_tenant()
+    enable_state()
+    try:
+        jira_statuses()
+        if tenant.clockify_api_key:
+            clockify_users()
+            clockify_projects()
+    except Exception as e:
+        logging.error("Erro ao pré-aquecer os metadados do tenant %s: %s", tenant.name, e)
+    boards = jira_boards()
+    logging.info("Pré-aquecendo %s boards do tenant %s.", len(boards), tenant.name)
+    map_boards(prewarm_board, [board.id for board in boards])
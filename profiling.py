@@ -0,0 +1,117 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+# Diretório do projeto: frames fora dele são da biblioteca padrão ou de dependências
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Worker do pool parado esperando tarefa: amostra descartada
+IDLE_FRAMES = {('tenants.py', '_worker')}
+
+# Diretório da biblioteca padrão
+STDLIB_DIR = os.path.dirname(threading.__file__)
+
+# Esperas bloqueantes da biblioteca padrão (arquivo relativo a STDLIB_DIR, função).
+# Se o frame mais interno da thread é uma delas, a thread está parada: listener
+# do log, executors ociosos, heartbeat ou o job esperando `future.result()`
+BLOCKING_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    (os.path.join('concurrent', 'futures', 'thread.py'), '_worker'),
+}
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    """Profiler por amostragem de todas as threads do processo.
+
+    Os jobs rodam nos workers do pool, e não na thread que chama o profiler,
+    por isso as pilhas são lidas de `sys._current_frames()` a cada `interval`
+    segundos. O resultado sai no formato de pilhas "colapsadas"
+    (uma linha `raiz;...;folha contagem`), aceito por flamegraph.pl e speedscope.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample_loop, name='profiler', daemon=True)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _is_idle(self, frames):
+        if not frames:
+            return True
+        innermost = frames[-1].f_code
+        if innermost.co_filename.startswith(STDLIB_DIR) and (
+                os.path.relpath(innermost.co_filename, STDLIB_DIR), innermost.co_name) in BLOCKING_FRAMES:
+            return True
+        # O frame mais interno do projeto decide: pool ocioso não conta
+        for frame in reversed(frames):
+            filename = frame.f_code.co_filename
+            if filename.startswith(PROJECT_DIR):
+                return (os.path.basename(filename), frame.f_code.co_name) in IDLE_FRAMES
+        return False
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(frame)
+                    frame = frame.f_back
+                frames.reverse()
+                if self._is_idle(frames):
+                    continue
+                self.stacks[';'.join(_frame_label(f) for f in frames)] += 1
+                self.samples += 1
+
+    def write_folded(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+    def hot_paths(self, limit=25):
+        """Funções com mais amostras: (função, próprias, inclusivas), ordenadas pelas próprias.
+
+        "Próprias" são as amostras em que a função estava no topo da pilha;
+        "inclusivas" contam também o tempo gasto nas funções que ela chamou.
+        """
+        own = Counter()
+        inclusive = Counter()
+        for stack, count in self.stacks.items():
+            labels = stack.split(';')
+            own[labels[-1]] += count
+            for label in set(labels):
+                inclusive[label] += count
+        ranked = sorted(inclusive, key=lambda label: (-own[label], -inclusive[label]))[:limit]
+        return [(label, own[label], inclusive[label]) for label in ranked]
+
+    def summary(self, limit=25):
+        lines = [f"{'próprias':>9} {'inclusivas':>10}  função (de {self.samples} amostras, {self.interval * 1000:.0f} ms)"]
+        for label, own, inclusive in self.hot_paths(limit):
+            lines.append(f"{own:>9} {inclusive:>10}  {label}")
+        return '\n'.join(lines)
@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from requests.adapters import HTTPAdapter
+
+# Respostas que indicam que o Jira está limitando as requisições
+THROTTLE_STATUS = (429, 503)
+
+# Espera máxima (segundos) quando a resposta não traz Retry-After
+MAX_BACKOFF = 60
+
+
+def retry_after(response):
+    """Segundos pedidos pelo servidor no cabeçalho Retry-After (número ou data HTTP)."""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveLimiter:
+    """Limite de requisições simultâneas ajustado por AIMD.
+
+    Enquanto as respostas chegam sem erro e com latência próxima da menor
+    observada, o limite cresce 1 a cada janela de `limit` respostas (aumento
+    aditivo). Um 429/503 reduz o limite pela metade (redução multiplicativa) e
+    pausa todas as requisições pelo tempo pedido no Retry-After. O limite é
+    compartilhado por todos os jobs e boards que usam o mesmo site do Jira.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=16, latency_tolerance=2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_tolerance = latency_tolerance
+        self.limit = float(min(max(initial, minimum), maximum))
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._min_latency = None
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait > 0:
+                    self._cond.wait(wait)
+                elif self._in_flight < int(self.limit):
+                    break
+                else:
+                    self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, latency, status=None):
+        """Libera a vaga e ajusta o limite conforme o resultado da requisição."""
+        with self._cond:
+            self._in_flight -= 1
+            if status in THROTTLE_STATUS:
+                # Tratado em `backoff`
+                pass
+            elif status is None or status >= 500:
+                # Erro de rede ou do servidor: reduz sem pausar
+                self.limit = max(self.minimum, self.limit * 0.75)
+            else:
+                # A menor latência sobe devagar, para acompanhar mudanças no servidor
+                if self._min_latency is None or latency < self._min_latency:
+                    self._min_latency = latency
+                else:
+                    self._min_latency *= 1.001
+                if latency <= self._min_latency * self.latency_tolerance:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def backoff(self, delay):
+        """Reduz o limite e pausa as novas requisições por `delay` segundos."""
+        with self._cond:
+            now = time.monotonic()
+            # Várias respostas 429 da mesma rajada contam como um único evento
+            if now >= self._paused_until:
+                self.limit = max(self.minimum, self.limit / 2)
+                logging.warning("Jira limitando requisições: aguardando %.1fs, limite de %s requisições simultâneas.",
+                                delay, int(self.limit))
+            self._paused_until = max(self._paused_until, now + delay)
+            self._cond.notify_all()
+
+
+class AdaptiveAdapter(HTTPAdapter):
+    """Adapter HTTP que passa cada requisição pelo limitador e repete as limitadas (429/503)."""
+
+    def __init__(self, limiter, retries=5, **kwargs):
+        self.limiter = limiter
+        self.retries = retries
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            started = time.monotonic()
+            response = None
+            try:
+                response = super().send(request, **kwargs)
+            finally:
+                self.limiter.release(time.monotonic() - started,
+                                     response.status_code if response is not None else None)
+            if response.status_code not in THROTTLE_STATUS or attempt >= self.retries:
+                return response
+            delay = retry_after(response)
+            self.limiter.backoff(delay if delay is not None else min(MAX_BACKOFF, 2 ** attempt))
+            response.close()
+            attempt += 1
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(key):
+    """Limitador compartilhado no processo para um site do Jira (`key` = URL do site)."""
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = AdaptiveLimiter(
+                initial=int(os.getenv('JIRA_INITIAL_CONCURRENCY', '4')),
+                maximum=int(os.getenv('JIRA_MAX_CONCURRENCY', '16')),
+            )
+        return _limiters[key]
+
+
+def jira_adapter(key, **kwargs):
+    return AdaptiveAdapter(get_limiter(key), retries=int(os.getenv('JIRA_MAX_RETRIES', '5')), **kwargs)
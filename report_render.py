@@ -0,0 +1,137 @@
+import io
+import json
+import logging
+from collections import namedtuple
+from string import Formatter
+
+# Limite de caracteres de uma mensagem do Discord
+DISCORD_MAX_CHARS = 2000
+
+
+class Template:
+    """Template no formato do str.format, analisado uma única vez.
+
+    `render_into` monta o texto renderizado e o escreve no MessageBuilder como
+    um bloco só: cada renderização fica inteira na mesma mensagem, a menos que
+    sozinha passe do limite de caracteres do Discord.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._parts = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if literal:
+                self._parts.append((literal, None, None, None))
+            if field is not None:
+                self._parts.append((None, field, spec, conversion))
+
+    def _pieces(self, values):
+        for literal, field, spec, conversion in self._parts:
+            if literal is not None:
+                yield literal
+                continue
+            value = values[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 's':
+                value = str(value)
+            yield format(value, spec or '')
+
+    def render(self, **values):
+        return ''.join(self._pieces(values))
+
+    def render_into(self, builder, **values):
+        builder.write(self.render(**values))
+
+
+class MessageBuilder:
+    """Acumula o texto do relatório já dividido em mensagens de até `max_chars`.
+
+    Cada `write` é tratado como um bloco: se não couber na mensagem atual, ele
+    começa a próxima mensagem, em vez de ser cortado no meio. Blocos maiores
+    que o limite são quebrados por linhas e, em último caso, por caracteres.
+    """
+
+    def __init__(self, max_chars=DISCORD_MAX_CHARS):
+        self.max_chars = max_chars
+        self._messages = []
+        self._parts = []
+        self._length = 0
+
+    def _flush(self):
+        if self._parts:
+            self._messages.append(''.join(self._parts))
+            self._parts = []
+            self._length = 0
+
+    def _append(self, text):
+        if self._length + len(text) > self.max_chars:
+            self._flush()
+        self._parts.append(text)
+        self._length += len(text)
+
+    def write(self, text):
+        if not text:
+            return
+        if len(text) <= self.max_chars:
+            self._append(text)
+            return
+        for line in text.splitlines(keepends=True):
+            for i in range(0, len(line), self.max_chars):
+                self._append(line[i:i + self.max_chars])
+
+    def new_message(self):
+        """Força o início de uma nova mensagem."""
+        self._flush()
+
+    def messages(self):
+        self._flush()
+        return self._messages
+
+
+# Limites de um post de webhook do Discord: anexos por mensagem e tamanho total do upload
+DISCORD_MAX_ATTACHMENTS = 10
+DISCORD_MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+
+# Arquivo anexado a um post; `data` são os bytes já em memória
+Attachment = namedtuple('Attachment', ['filename', 'data', 'content_type'])
+
+
+def figure_attachment(fig, filename):
+    """Renderiza uma Figure do matplotlib em PNG na memória, pronta para anexar."""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    return Attachment(filename, buf.getvalue(), 'image/png')
+
+
+def bundle_posts(messages, attachments=(), max_attachments=DISCORD_MAX_ATTACHMENTS,
+                 max_bytes=DISCORD_MAX_UPLOAD_BYTES):
+    """Agrupa mensagens e anexos em posts: [(texto, [anexos])].
+
+    Os anexos vão junto da primeira mensagem, até o limite de anexos e de bytes
+    por post; os que não couberem seguem nas mensagens seguintes ou em posts
+    só com anexos.
+    """
+    groups = []
+    for attachment in attachments:
+        size = len(attachment.data)
+        if (not groups or len(groups[-1]) >= max_attachments
+                or sum(len(a.data) for a in groups[-1]) + size > max_bytes):
+            groups.append([])
+        groups[-1].append(attachment)
+
+    messages = list(messages)
+    return [(messages[i] if i < len(messages) else '', groups[i] if i < len(groups) else [])
+            for i in range(max(len(messages), len(groups)))]
+
+
+def send_posts(session, webhook_url, posts):
+    """Envia os posts ao webhook: JSON para texto puro, multipart quando há anexos."""
+    for content, attachments in posts:
+        if attachments:
+            files = {f'files[{i}]': (a.filename, a.data, a.content_type) for i, a in enumerate(attachments)}
+            response = session.post(webhook_url, data={'payload_json': json.dumps({'content': content})}, files=files)
+        else:
+            response = session.post(webhook_url, json={'content': content})
+        logging.info("Post enviado ao Discord (%s anexos): %s", len(attachments), response.status_code)
+        response.raise_for_status()
@@ -0,0 +1,250 @@
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from job_logging import log_context, new_run_id
+
+# Políticas para execuções perdidas (processo parado, máquina suspensa, etc.)
+MISFIRE_RUN_ONCE = 'run_once'  # Executa uma única vez e reagenda a partir de agora
+MISFIRE_SKIP = 'skip'          # Descarta a execução perdida e espera a próxima
+
+CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+)
+
+
+def parse_cron_field(expr, low, high):
+    """Converte um campo cron (*, */n, a-b, a-b/n, a,b) no conjunto de valores aceitos."""
+    values = set()
+    for part in expr.split(','):
+        step = 1
+        if '/' in part:
+            part, step_str = part.split('/', 1)
+            step = int(step_str)
+            if step <= 0:
+                raise ValueError(f"Passo inválido na expressão cron: {expr}")
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_str, end_str = part.split('-', 1)
+            start, end = int(start_str), int(end_str)
+        else:
+            start = end = int(part)
+        if start < low or end > high or start > end:
+            raise ValueError(f"Valor fora do intervalo na expressão cron: {expr}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """Agenda no formato cron clássico: 'minuto hora dia mês dia_da_semana'."""
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Expressão cron deve ter 5 campos: {expression}")
+        self.expression = expression
+        fields = {}
+        for (name, low, high), part in zip(CRON_FIELDS, parts):
+            fields[name] = parse_cron_field(part, low, high)
+        # No cron, 0 e 7 representam o domingo
+        if 7 in fields['weekday']:
+            fields['weekday'].discard(7)
+            fields['weekday'].add(0)
+        self.minutes = fields['minute']
+        self.hours = fields['hour']
+        self.days = fields['day']
+        self.months = fields['month']
+        self.weekdays = fields['weekday']
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        # Mesma regra do cron: se dia e dia da semana forem restritos, basta um dos dois
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, dt):
+        """Retorna o próximo instante (com precisão de minuto) estritamente após `dt`."""
+        candidate = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+        while candidate < limit:
+            if candidate.month not in self.months:
+                year = candidate.year + (candidate.month == 12)
+                month = candidate.month % 12 + 1
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+        raise ValueError(f"Expressão cron nunca dispara: {self.expression}")
+
+
+class ScheduledJob:
+    """Estado de um job registrado no scheduler."""
+
+    def __init__(self, name, func, cron, misfire=MISFIRE_RUN_ONCE, misfire_grace=300):
+        self.name = name
+        self.func = func
+        self.schedule = CronSchedule(cron)
+        self.misfire = misfire
+        self.misfire_grace = misfire_grace
+        self.next_run = None
+        self.last_start = None
+        self.last_duration = None
+        self.last_status = None
+        self.running = False
+        self.lock = threading.Lock()
+
+    def state(self):
+        return {
+            'name': self.name,
+            'cron': self.schedule.expression,
+            'running': self.running,
+            'next_run': self.next_run,
+            'last_start': self.last_start,
+            'last_duration': self.last_duration,
+            'last_status': self.last_status,
+        }
+
+
+class Scheduler:
+    """Dispara cada job na sua própria agenda cron usando um pool de workers.
+
+    Cada job roda no máximo uma vez por vez (single-flight): se a próxima
+    execução chegar enquanto a anterior ainda está rodando, ela é descartada.
+
+    Com `state_path`, o instante em que cada job foi disparado (ou teve a
+    execução descartada) pela última vez é gravado em um arquivo JSON. Ao reiniciar, a próxima execução é calculada
+    a partir dele, e as execuções perdidas com o processo parado passam pela
+    política de misfire do job.
+    """
+
+    def __init__(self, max_workers=4, state_path=None):
+        self.jobs = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.state_path = state_path
+        self._last_runs = self._load_state()
+        self._stop = threading.Event()
+
+    def _load_state(self):
+        if not self.state_path:
+            return {}
+        try:
+            with open(self.state_path, encoding='utf-8') as file:
+                return {name: datetime.fromisoformat(value) for name, value in json.load(file).items()}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            logging.warning("Estado do scheduler ilegível em %s; agendando a partir de agora: %s", self.state_path, e)
+            return {}
+
+    def _save_last_run(self, job, handled_at):
+        self._last_runs[job.name] = handled_at
+        if not self.state_path:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.state_path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                json.dump({name: value.isoformat() for name, value in self._last_runs.items()}, file)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            logging.error("Erro ao gravar o estado do scheduler em %s: %s", self.state_path, e)
+
+    def add_job(self, name, func, cron, misfire=MISFIRE_RUN_ONCE, misfire_grace=300, now=None):
+        if misfire not in (MISFIRE_RUN_ONCE, MISFIRE_SKIP):
+            raise ValueError(f"Política de misfire desconhecida: {misfire}")
+        job = ScheduledJob(name, func, cron, misfire, misfire_grace)
+        last_run = self._last_runs.get(name)
+        # Sem histórico, a agenda começa agora; com histórico, a primeira execução
+        # perdida desde a última fica vencida e o `tick` aplica a política de misfire
+        job.next_run = job.schedule.next_after(last_run or now or datetime.now())
+        self.jobs[name] = job
+        logging.info("Job %s agendado (%s). Próxima execução: %s", name, cron, job.next_run)
+        return job
+
+    def state(self):
+        """Retorna próxima execução, última duração e status de cada job."""
+        return [job.state() for job in self.jobs.values()]
+
+    def run_job_now(self, name):
+        """Submete o job imediatamente, respeitando o single-flight."""
+        return self._submit(self.jobs[name])
+
+    def tick(self, now=None):
+        """Verifica os jobs vencidos e os submete ao pool."""
+        now = now or datetime.now()
+        for job in self.jobs.values():
+            if job.next_run is None or job.next_run > now:
+                continue
+
+            late_by = (now - job.next_run).total_seconds()
+            # Reagenda a partir de agora: execuções perdidas são agrupadas em uma só
+            scheduled_for = job.next_run
+            job.next_run = job.schedule.next_after(now)
+            # Grava o instante tratado, não o horário perdido: execuções agrupadas não se repetem ao reiniciar
+            self._save_last_run(job, now)
+
+            if job.misfire == MISFIRE_SKIP and late_by > job.misfire_grace:
+                logging.warning("Execução de %s das %s perdida (%.0fs de atraso). Próxima: %s",
+                                job.name, scheduled_for, late_by, job.next_run)
+                continue
+
+            self._submit(job)
+
+    def _submit(self, job):
+        if not job.lock.acquire(blocking=False):
+            logging.warning("Job %s ainda em execução; execução ignorada.", job.name)
+            return None
+        job.running = True
+        return self.executor.submit(self._run, job)
+
+    def _run(self, job):
+        with log_context(job=job.name, run_id=new_run_id()):
+            self._run_job(job)
+
+    def _run_job(self, job):
+        job.last_start = datetime.now()
+        started = time.monotonic()
+        logging.info("Iniciando job %s.", job.name)
+        try:
+            job.func()
+            job.last_status = 'success'
+        except Exception as e:
+            job.last_status = 'error'
+            logging.error("Ocorreu um erro no job %s: %s", job.name, e)
+        finally:
+            job.last_duration = time.monotonic() - started
+            job.running = False
+            job.lock.release()
+            logging.info("Job %s finalizado em %.1fs (%s). Próxima execução: %s",
+                         job.name, job.last_duration, job.last_status, job.next_run)
+
+    def run_forever(self, poll_interval=1):
+        while not self._stop.is_set():
+            self.tick()
+            self._stop.wait(poll_interval)
+
+    def shutdown(self, wait=True):
+        self._stop.set()
+        self.executor.shutdown(wait=wait)
@@ -0,0 +1,31 @@
+import contextvars
+from contextlib import contextmanager
+
+# Boards (id ou nome) e projetos (chave) selecionados para a execução atual; None = todos
+_boards = contextvars.ContextVar('selected_boards', default=None)
+_projects = contextvars.ContextVar('selected_projects', default=None)
+
+
+@contextmanager
+def select(boards=None, projects=None):
+    """Restringe os jobs executados dentro do bloco aos boards e projetos informados."""
+    boards_token = _boards.set({str(board) for board in boards} if boards else None)
+    projects_token = _projects.set({str(project).upper() for project in projects} if projects else None)
+    try:
+        yield
+    finally:
+        _projects.reset(projects_token)
+        _boards.reset(boards_token)
+
+
+def project_selected(project_key):
+    projects = _projects.get()
+    return projects is None or str(project_key).upper() in projects
+
+
+def board_selected(board):
+    boards = _boards.get()
+    if boards is not None and str(board.id) not in boards and getattr(board, 'name', None) not in boards:
+        return False
+    location = getattr(board, 'location', None)
+    return _projects.get() is None or project_selected(getattr(location, 'projectKey', ''))
@@ -0,0 +1,251 @@
+import bisect
+import hashlib
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS replicas (
+    replica_id TEXT PRIMARY KEY,
+    heartbeat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS leases (
+    tenant TEXT NOT NULL,
+    job TEXT NOT NULL,
+    run_key TEXT NOT NULL,
+    item TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tenant, job, run_key, item)
+);
+"""
+
+VIRTUAL_NODES = 64
+
+# Item usado para jobs que não são divididos por board: o job inteiro roda em uma réplica só
+WHOLE_JOB = '*'
+
+# Valores da coluna `done` das leases: pendente, concluído ou com falha na última tentativa
+PENDING, DONE, FAILED = 0, 1, -1
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """Anel de hashing consistente: a saída/entrada de uma réplica só move os itens dela."""
+
+    def __init__(self, replicas, virtual_nodes=VIRTUAL_NODES):
+        points = sorted((_hash(f'{replica}#{i}'), replica) for replica in replicas for i in range(virtual_nodes))
+        self._hashes = [point for point, _ in points]
+        self._replicas = [replica for _, replica in points]
+
+    def owner(self, key):
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._replicas[index]
+
+
+class ShardCoordinator:
+    """Divide boards e projetos entre réplicas usando um SQLite compartilhado.
+
+    Cada réplica mantém um heartbeat; as réplicas vivas formam o anel de
+    hashing consistente que define o dono de cada item. Antes de processar um
+    item a réplica obtém uma lease (renovada enquanto ela estiver viva), e o
+    item é marcado como concluído na execução (`run_key`). Se uma réplica
+    morre, o heartbeat e as leases dela expiram e os itens pendentes passam
+    para as réplicas restantes. Um item que falhou tem a lease liberada e é
+    processado de novo na próxima tentativa do job.
+
+    Cada réplica lê a lista de boards do seu próprio cache, então as listas
+    podem divergir. Um item que continua sem lease `claim_grace` segundos
+    depois do início da execução pode ser obtido por qualquer réplica que o
+    conheça, mesmo não sendo a dona dele no anel.
+    """
+
+    def __init__(self, path, replica_id, lease_ttl=60, poll_interval=5, run_timeout=2 * 3600, claim_grace=120):
+        self.path = path
+        self.replica_id = replica_id
+        self.lease_ttl = lease_ttl
+        self.claim_grace = claim_grace
+        self.poll_interval = poll_interval
+        self.run_timeout = run_timeout
+        self._stop = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(SCHEMA)
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._heartbeat_loop, name='shard-heartbeat', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        # Autocommit: as transações são abertas explicitamente com BEGIN IMMEDIATE
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def heartbeat(self):
+        """Atualiza o heartbeat da réplica e renova as leases que ela ainda está processando."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('INSERT OR REPLACE INTO replicas (replica_id, heartbeat_at) VALUES (?, ?)',
+                         (self.replica_id, now))
+            conn.execute('UPDATE leases SET expires_at = ? WHERE owner = ? AND done = ?',
+                         (now + self.lease_ttl, self.replica_id, PENDING))
+            conn.execute('COMMIT')
+
+    def _heartbeat_loop(self):
+        while not self._stop.wait(self.lease_ttl / 3):
+            try:
+                self.heartbeat()
+            except sqlite3.Error as e:
+                logging.error("Erro ao atualizar o heartbeat da réplica %s: %s", self.replica_id, e)
+
+    def live_replicas(self):
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT replica_id FROM replicas WHERE heartbeat_at >= ?',
+                                (time.time() - self.lease_ttl,)).fetchall()
+        return sorted({row[0] for row in rows} | {self.replica_id})
+
+    def try_lease(self, key, item):
+        """Tenta obter a lease do item; falha se já foi concluído ou está com outra réplica viva.
+
+        Um item que falhou em uma tentativa anterior pode ser obtido de novo.
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute(
+                'INSERT OR IGNORE INTO leases (tenant, job, run_key, item, owner, expires_at) VALUES (?, ?, ?, ?, ?, ?)',
+                (*key, item, self.replica_id, now + self.lease_ttl),
+            )
+            claimed = conn.execute(
+                'UPDATE leases SET owner = ?, expires_at = ?, done = ? '
+                'WHERE tenant = ? AND job = ? AND run_key = ? AND item = ? AND done != ? '
+                'AND (owner = ? OR expires_at < ?)',
+                (self.replica_id, now + self.lease_ttl, PENDING, *key, item, DONE, self.replica_id, now),
+            ).rowcount
+            conn.execute('COMMIT')
+        return claimed == 1
+
+    def mark_done(self, key, item):
+        with closing(self._connect()) as conn:
+            conn.execute('UPDATE leases SET done = ? WHERE tenant = ? AND job = ? AND run_key = ? AND item = ?',
+                         (DONE, *key, item))
+
+    def mark_failed(self, key, item):
+        """Registra a falha e libera a lease, para a próxima tentativa poder processar o item."""
+        with closing(self._connect()) as conn:
+            conn.execute('UPDATE leases SET done = ?, expires_at = 0 '
+                         'WHERE tenant = ? AND job = ? AND run_key = ? AND item = ? AND owner = ?',
+                         (FAILED, *key, item, self.replica_id))
+
+    def item_states(self, key):
+        """{item: PENDING/DONE/FAILED} dos itens da execução que já têm lease."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute('SELECT item, done FROM leases WHERE tenant = ? AND job = ? AND run_key = ?',
+                                key).fetchall()
+        return dict(rows)
+
+    def map_items(self, tenant, job, items, run, run_key=None):
+        """Processa os itens do job que cabem a esta réplica, uma única vez por execução.
+
+        `run(itens)` processa um lote e retorna {item: resultado} só com os
+        itens processados com sucesso; os ausentes (ou todos, se `run` lançar
+        uma exceção) contam como falha e não são marcados como concluídos. A
+        réplica continua acompanhando a execução até todos os itens estarem
+        concluídos ou com falha, para assumir os itens de réplicas que pararem
+        no meio.
+        """
+        run_key = run_key or os.getenv('SHARD_RUN_KEY') or datetime.now().strftime('%Y-%m-%d')
+        key = (tenant, job, run_key)
+        by_name = {str(item): item for item in items}
+        results = {}
+        failed = set()
+        retry_failed = True
+        started = time.monotonic()
+        deadline = started + self.run_timeout
+
+        while True:
+            states = self.item_states(key)
+            # Só na primeira passada os itens que falharam em tentativas anteriores voltam a ser processados
+            pending = [name for name in by_name
+                       if name not in failed and states.get(name, PENDING) != DONE
+                       and (retry_failed or states.get(name, PENDING) != FAILED)]
+            retry_failed = False
+            if not pending:
+                break
+            ring = HashRing(self.live_replicas())
+            # Passada a carência, itens que nenhuma réplica pegou (o dono não os conhece) ficam livres
+            orphans_free = time.monotonic() - started > self.claim_grace
+            claimed = [name for name in pending
+                       if (ring.owner(f'{key[0]}:{job}:{name}') == self.replica_id
+                           or (orphans_free and name not in states))
+                       and self.try_lease(key, name)]
+            if claimed:
+                logging.info("Réplica %s processando %s de %s itens pendentes de %s.",
+                             self.replica_id, len(claimed), len(pending), job)
+                batch = {}
+                try:
+                    batch = run([by_name[name] for name in claimed])
+                finally:
+                    for name in claimed:
+                        if by_name[name] in batch:
+                            results[by_name[name]] = batch[by_name[name]]
+                            self.mark_done(key, name)
+                        else:
+                            self.mark_failed(key, name)
+                            failed.add(name)
+                continue
+            if time.monotonic() > deadline:
+                logging.warning("Tempo esgotado aguardando %s itens de %s em outras réplicas.", len(pending), job)
+                break
+            self._stop.wait(self.poll_interval)
+        return [results.get(item) for item in items]
+
+    def stop(self):
+        self._stop.set()
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_coordinator():
+    """Coordenador de shards, ou None quando o modo de várias réplicas está desligado (SHARD_DB)."""
+    global _coordinator
+    path = os.getenv('SHARD_DB')
+    if not path:
+        return None
+    with _coordinator_lock:
+        if _coordinator is None:
+            _coordinator = ShardCoordinator(
+                path,
+                os.getenv('SHARD_REPLICA_ID') or f'{socket.gethostname()}-{os.getpid()}',
+                lease_ttl=int(os.getenv('SHARD_LEASE_TTL', '60')),
+                run_timeout=int(os.getenv('SHARD_RUN_TIMEOUT', str(2 * 3600))),
+                claim_grace=int(os.getenv('SHARD_CLAIM_GRACE', '120')),
+            )
+        return _coordinator
+
+
+def shard_items(tenant, job, items, run):
+    """Executa `run(itens)` sobre todos os itens, ou só sobre a parte desta réplica no modo de shards.
+
+    `run` retorna {item: resultado} só com os itens processados com sucesso.
+    """
+    coordinator = get_coordinator()
+    if coordinator is None:
+        results = run(list(items))
+        return [results.get(item) for item in items]
+    return coordinator.map_items(tenant, job, items, run)
@@ -0,0 +1,271 @@
+import logging
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+from tenants import current_tenant
+from jira_search import SPRINT_FIELD, STORY_POINTS_FIELD
+from issue_state import iter_sprint_issues, sprint_category_counts
+from issue_table import IssueTable, UNASSIGNED
+
+# Agregados de um sprint (por board) e de cada desenvolvedor no sprint.
+# committed: issues do sprint ao fechar; carried_over: as que não foram concluídas nele
+# (inclusive as concluídas depois, em um sprint posterior).
+SprintStats = namedtuple('SprintStats', [
+    'board_id', 'sprint_id', 'sprint_name', 'start_date', 'end_date',
+    'committed', 'completed', 'in_progress', 'carried_over', 'points_committed', 'points_completed',
+])
+
+DeveloperStats = namedtuple('DeveloperStats', [
+    'sprint_id', 'developer_id', 'developer',
+    'committed', 'completed', 'carried_over', 'points_committed', 'points_completed',
+])
+
+ISSUE_FIELDS = ('status', 'assignee', STORY_POINTS_FIELD, SPRINT_FIELD)
+
+# Versão do cálculo gravado no histórico; ao mudar, os sprints são materializados de novo
+HISTORY_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sprint_stats (
+    tenant TEXT NOT NULL,
+    board_id INTEGER NOT NULL,
+    sprint_id INTEGER NOT NULL,
+    sprint_name TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    committed INTEGER NOT NULL,
+    completed INTEGER NOT NULL,
+    in_progress INTEGER NOT NULL,
+    carried_over INTEGER NOT NULL,
+    points_committed REAL NOT NULL,
+    points_completed REAL NOT NULL,
+    PRIMARY KEY (tenant, sprint_id)
+);
+CREATE INDEX IF NOT EXISTS sprint_stats_board ON sprint_stats (tenant, board_id, end_date);
+CREATE TABLE IF NOT EXISTS developer_stats (
+    tenant TEXT NOT NULL,
+    sprint_id INTEGER NOT NULL,
+    developer_id TEXT NOT NULL,
+    developer TEXT,
+    committed INTEGER NOT NULL,
+    completed INTEGER NOT NULL,
+    carried_over INTEGER NOT NULL,
+    points_committed REAL NOT NULL,
+    points_completed REAL NOT NULL,
+    PRIMARY KEY (tenant, sprint_id, developer_id)
+);
+"""
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%dT%H:%M:%S.%f%z')
+    except (TypeError, ValueError):
+        return None
+
+
+def moved_to_later_sprint(sprint, issue_sprints):
+    """Indica se a issue também está em um sprint posterior ao `sprint`, ou seja, foi levada adiante.
+
+    Usa os sprints da issue (campo de sprint do Jira) e não o status atual:
+    uma issue concluída só no sprint seguinte não conta como concluída neste.
+    """
+    start = _parse_date(getattr(sprint, 'startDate', None))
+    for other in issue_sprints or ():
+        if other.get('id') == sprint.id:
+            continue
+        if other.get('state') in ('active', 'future'):
+            return True
+        other_start = _parse_date(other.get('startDate'))
+        if start is not None and other_start is not None and other_start > start:
+            return True
+    return False
+
+
+def sprint_table(sprint, jira=None):
+    """IssueTable do sprint com responsável (accountId), story points e se a issue foi levada adiante."""
+    return IssueTable.from_issues(
+        iter_sprint_issues(sprint.id, ISSUE_FIELDS, jira=jira),
+        extra_columns=('assignee_id', 'points', 'moved'),
+        extra=lambda issue: (issue.assignee_id or '', issue.points, moved_to_later_sprint(sprint, issue.sprints)),
+    )
+
+
+def compute_stats(board_id, sprint, table):
+    """Calcula os agregados do sprint e de cada desenvolvedor a partir da IssueTable."""
+    # Concluída no sprint: no status de concluída e sem ter sido levada para um sprint posterior
+    frame = table.frame.assign(
+        done=table.done_mask() & ~table.frame['moved'].astype(bool).to_numpy(),
+        in_progress=table.in_progress_mask(),
+        points=np.nan_to_num(table.frame['points'].to_numpy(dtype=float, na_value=np.nan)),
+    )
+    frame['points_done'] = frame['points'].where(frame['done'], 0.0)
+
+    committed = len(frame)
+    completed = int(frame['done'].sum())
+    stats = SprintStats(
+        board_id=board_id,
+        sprint_id=sprint.id,
+        sprint_name=sprint.name,
+        start_date=getattr(sprint, 'startDate', None),
+        end_date=getattr(sprint, 'completeDate', None) or getattr(sprint, 'endDate', None),
+        committed=committed,
+        completed=completed,
+        in_progress=int(frame['in_progress'].sum()),
+        carried_over=committed - completed,
+        points_committed=float(frame['points'].sum()),
+        points_completed=float(frame['points_done'].sum()),
+    )
+
+    developers = []
+    grouped = frame.groupby('assignee_id', sort=False).agg(
+        developer=('assignee', 'first'),
+        committed=('key', 'size'),
+        completed=('done', 'sum'),
+        points_committed=('points', 'sum'),
+        points_completed=('points_done', 'sum'),
+    )
+    for developer_id, row in grouped.iterrows():
+        developers.append(DeveloperStats(
+            sprint_id=sprint.id,
+            developer_id=developer_id,
+            developer=row['developer'] if developer_id else UNASSIGNED,
+            committed=int(row['committed']),
+            completed=int(row['completed']),
+            carried_over=int(row['committed'] - row['completed']),
+            points_committed=float(row['points_committed']),
+            points_completed=float(row['points_completed']),
+        ))
+    return stats, developers
+
+
+class SprintHistory:
+    """Histórico materializado (SQLite) dos sprints fechados.
+
+    Um sprint fechado não muda mais: seus agregados são gravados uma única vez
+    e depois lidos pela chave primária, sem consultar o Jira.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+            # Sprints gravados por um cálculo anterior são descartados e materializados de novo
+            if conn.execute('PRAGMA user_version').fetchone()[0] < HISTORY_VERSION:
+                with conn:
+                    conn.execute('DELETE FROM sprint_stats')
+                    conn.execute('DELETE FROM developer_stats')
+                conn.execute(f'PRAGMA user_version = {HISTORY_VERSION}')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, tenant, sprint_id):
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                f"SELECT {', '.join(SprintStats._fields)} FROM sprint_stats WHERE tenant = ? AND sprint_id = ?",
+                (tenant, sprint_id),
+            ).fetchone()
+        return SprintStats(*row) if row else None
+
+    def developers(self, tenant, sprint_id):
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(DeveloperStats._fields)} FROM developer_stats WHERE tenant = ? AND sprint_id = ?",
+                (tenant, sprint_id),
+            ).fetchall()
+        return [DeveloperStats(*row) for row in rows]
+
+    def board_history(self, tenant, board_id):
+        """Sprints fechados do board já materializados, do mais antigo para o mais recente."""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(SprintStats._fields)} FROM sprint_stats "
+                "WHERE tenant = ? AND board_id = ? ORDER BY end_date",
+                (tenant, board_id),
+            ).fetchall()
+        return [SprintStats(*row) for row in rows]
+
+    def save(self, tenant, stats, developers):
+        with self._lock, closing(self._connect()) as conn:
+            with conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO sprint_stats (tenant, {', '.join(SprintStats._fields)}) "
+                    f"VALUES (?, {', '.join('?' * len(SprintStats._fields))})",
+                    (tenant, *stats),
+                )
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO developer_stats (tenant, {', '.join(DeveloperStats._fields)}) "
+                    f"VALUES (?, {', '.join('?' * len(DeveloperStats._fields))})",
+                    [(tenant, *developer) for developer in developers],
+                )
+
+
+_history = None
+_history_lock = threading.Lock()
+
+
+def get_history():
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = SprintHistory(os.getenv('SPRINT_HISTORY_DB', os.path.join('.cache', 'sprint_history.sqlite3')))
+        return _history
+
+
+def sprint_stats(board_id, sprint):
+    """Agregados (sprint, desenvolvedores) de um sprint do tenant atual.
+
+    Sprints fechados vêm do histórico; se ainda não estiverem lá, são
+    calculados uma vez no Jira e gravados. Os demais são sempre calculados.
+    """
+    tenant = current_tenant()
+    history = get_history()
+    if sprint.state == 'closed':
+        stats = history.get(tenant.name, sprint.id)
+        if stats is not None:
+            return stats, history.developers(tenant.name, sprint.id)
+
+    stats, developers = compute_stats(board_id, sprint, sprint_table(sprint, jira=tenant.jira))
+    if sprint.state == 'closed':
+        history.save(tenant.name, stats, developers)
+        logging.info("Sprint %s (%s) materializado no histórico.", sprint.name, sprint.id)
+    return stats, developers
+
+
+def closed_sprint_stats(board_id, sprints):
+    """Agregados dos sprints fechados do board, materializando os que faltarem."""
+    return [sprint_stats(board_id, sprint)[0] for sprint in sprints if sprint.state == 'closed']
+
+
+def sprint_counts(board_id, sprint):
+    """Apenas as contagens do sprint (sem desenvolvedores nem story points).
+
+    Sprints fechados vêm do histórico; os demais são contados por categoria
+    de status, sem baixar as issues.
+    """
+    if sprint.state == 'closed':
+        return sprint_stats(board_id, sprint)[0]
+    counts = sprint_category_counts(sprint.id, jira=current_tenant().jira)
+    return SprintStats(
+        board_id=board_id,
+        sprint_id=sprint.id,
+        sprint_name=sprint.name,
+        start_date=getattr(sprint, 'startDate', None),
+        end_date=getattr(sprint, 'endDate', None),
+        committed=counts['total'],
+        completed=counts['done'],
+        in_progress=counts['indeterminate'],
+        carried_over=counts['total'] - counts['done'],
+        points_committed=None,
+        points_completed=None,
+    )
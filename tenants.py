@@ -0,0 +1,291 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+
+import requests
+from dotenv import load_dotenv
+from jira import JIRA
+from requests.adapters import HTTPAdapter
+from job_logging import log_context
+from rate_limit import jira_adapter
+from sharding import WHOLE_JOB, shard_items
+
+# Carregar variáveis de ambiente do arquivo .env
+load_dotenv()
+
+
+class Tenant:
+    """Um site do Jira, um workspace do Clockify e as rotas board -> webhook do Discord."""
+
+    def __init__(self, name, jira_url, jira_username, jira_api_token, webhook_url=None,
+                 clockify_api_key=None, clockify_workspace_id=None, board_webhooks=None,
+                 max_concurrency=1, pool_size=10):
+        self.name = name
+        self.jira_url = jira_url
+        self.jira_username = jira_username
+        self.jira_api_token = jira_api_token
+        self.webhook_url = webhook_url
+        self.clockify_api_key = clockify_api_key
+        self.clockify_workspace_id = clockify_workspace_id
+        self.board_webhooks = {str(board): url for board, url in (board_webhooks or {}).items()}
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.pool_size = int(pool_size)
+        self._jira = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Tenant({self.name!r})"
+
+    def _mount_pool(self, session, adapter=None):
+        adapter = adapter or HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+
+    @property
+    def jira(self):
+        """Cliente do Jira do tenant, criado na primeira utilização."""
+        with self._lock:
+            if self._jira is None:
+                # Sem as repetições da própria biblioteca: o AdaptiveAdapter é o único que repete,
+                # respeitando o limitador compartilhado
+                self._jira = JIRA(basic_auth=(self.jira_username, self.jira_api_token),
+                                  options={'server': self.jira_url}, max_retries=0)
+                # A biblioteca do Jira não expõe o tamanho do pool de conexões. O limitador
+                # adaptativo é um só por site do Jira, compartilhado por todos os jobs
+                self._mount_pool(self._jira._session, jira_adapter(
+                    self.jira_url, pool_connections=self.pool_size, pool_maxsize=self.pool_size))
+                self._jira._session.headers['Accept-Encoding'] = 'gzip, deflate'
+                logging.info("Autenticado no Jira do tenant %s.", self.name)
+            return self._jira
+
+    @property
+    def session(self):
+        """Sessão HTTP (Discord e Clockify) com pool de conexões próprio do tenant."""
+        with self._lock:
+            if self._session is None:
+                self._session = requests.Session()
+                self._mount_pool(self._session)
+            return self._session
+
+    @property
+    def clockify_headers(self):
+        return {'X-Api-Key': self.clockify_api_key}
+
+    def webhook_for(self, board_id=None):
+        """Webhook do Discord para o board, ou o webhook padrão do tenant."""
+        if board_id is not None and str(board_id) in self.board_webhooks:
+            return self.board_webhooks[str(board_id)]
+        return self.webhook_url
+
+
+def tenant_from_env():
+    """Tenant único configurado pelas variáveis do .env (modo de um time por container)."""
+    return Tenant(
+        name=os.getenv('TENANT_NAME', 'default'),
+        jira_url=os.getenv('JIRA_URL'),
+        jira_username=os.getenv('JIRA_USERNAME'),
+        jira_api_token=os.getenv('JIRA_API_TOKEN'),
+        webhook_url=os.getenv('WEBHOOK_URL'),
+        clockify_api_key=os.getenv('CLOCKIFY_API_KEY'),
+        clockify_workspace_id=os.getenv('CLOCKIFY_WORKSPACE_ID'),
+        max_concurrency=int(os.getenv('TENANT_MAX_CONCURRENCY', '1')),
+    )
+
+
+def tenant_from_config(config):
+    """Cria um tenant a partir de uma entrada do arquivo de tenants.
+
+    Valores no formato ${VARIAVEL} são lidos do ambiente, para que os tokens
+    não precisem ficar no arquivo.
+    """
+    def value(section, key):
+        raw = config.get(section, {}).get(key) if section else config.get(key)
+        return os.path.expandvars(raw) if isinstance(raw, str) else raw
+
+    return Tenant(
+        name=config['name'],
+        jira_url=value('jira', 'url'),
+        jira_username=value('jira', 'username'),
+        jira_api_token=value('jira', 'api_token'),
+        webhook_url=value(None, 'webhook_url'),
+        clockify_api_key=value('clockify', 'api_key'),
+        clockify_workspace_id=value('clockify', 'workspace_id'),
+        board_webhooks={board: os.path.expandvars(url) for board, url in config.get('boards', {}).items()},
+        max_concurrency=config.get('max_concurrency', 1),
+        pool_size=config.get('pool_size', 10),
+    )
+
+
+def load_tenants(path=None):
+    """Lê o arquivo de tenants (TENANTS_FILE). Sem arquivo, usa o tenant do .env."""
+    path = path or os.getenv('TENANTS_FILE')
+    if not path:
+        return [tenant_from_env()]
+
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+    entries = data['tenants'] if isinstance(data, dict) else data
+    tenants = [tenant_from_config(entry) for entry in entries]
+    names = [tenant.name for tenant in tenants]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Nomes de tenant duplicados em {path}: {names}")
+    logging.info("%s tenants carregados de %s.", len(tenants), path)
+    return tenants
+
+
+_tenants = None
+_tenants_lock = threading.Lock()
+_current_tenant = contextvars.ContextVar('current_tenant', default=None)
+
+
+def get_tenants():
+    """Lista de tenants do processo, carregada uma única vez."""
+    global _tenants
+    with _tenants_lock:
+        if _tenants is None:
+            _tenants = load_tenants()
+        return _tenants
+
+
+def current_tenant():
+    """Tenant em uso no contexto atual; fora de `use_tenant`, o primeiro configurado."""
+    tenant = _current_tenant.get()
+    return tenant if tenant is not None else get_tenants()[0]
+
+
+@contextmanager
+def use_tenant(tenant):
+    token = _current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        _current_tenant.reset(token)
+
+
+class FairPool:
+    """Pool de workers compartilhado entre tenants.
+
+    As tarefas ficam em uma fila por tenant e são despachadas em round-robin,
+    respeitando o `max_concurrency` de cada tenant. Assim um tenant com muitos
+    boards não impede o andamento dos tenants menores.
+    """
+
+    def __init__(self, workers):
+        self._queues = OrderedDict()
+        self._active = defaultdict(int)
+        self._cond = threading.Condition()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'tenant-worker-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, tenant, func, *args):
+        future = Future()
+        context = contextvars.copy_context()
+        with self._cond:
+            self._queues.setdefault(tenant.name, deque()).append((tenant, future, context, func, args))
+            self._cond.notify()
+        return future
+
+    def _next_task(self):
+        for name, queue in self._queues.items():
+            if queue and self._active[name] < queue[0][0].max_concurrency:
+                # O tenant atendido vai para o fim da fila de rodízio
+                self._queues.move_to_end(name)
+                self._active[name] += 1
+                return queue.popleft()
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                task = self._next_task()
+                while task is None:
+                    self._cond.wait()
+                    task = self._next_task()
+            tenant, future, context, func, args = task
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(context.run(func, *args))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._active[tenant.name] -= 1
+                    self._cond.notify_all()
+
+
+_pool = None
+
+
+def get_pool():
+    global _pool
+    with _tenants_lock:
+        if _pool is None:
+            _pool = FairPool(int(os.getenv('TENANT_WORKERS', '8')))
+        return _pool
+
+
+def _run_board(func, board_id):
+    with log_context(board=board_id):
+        return func(board_id)
+
+
+def map_boards(func, board_ids):
+    """Executa `func(board_id)` para cada board do tenant atual no pool compartilhado.
+
+    A falha de um board é registrada e não interrompe os demais. No modo de
+    várias réplicas (SHARD_DB), cada réplica processa apenas os seus boards, e
+    um board que falhou não é marcado como concluído.
+    """
+    tenant = current_tenant()
+    pool = get_pool()
+
+    def run(batch):
+        futures = [(board_id, pool.submit(tenant, _run_board, func, board_id)) for board_id in batch]
+        results = {}
+        for board_id, future in futures:
+            try:
+                results[board_id] = future.result()
+            except Exception as e:
+                # Fora do resultado: o board fica disponível para a próxima tentativa
+                logging.error("Ocorreu um erro ao processar o board %s do tenant %s: %s", board_id, tenant.name, e)
+        return results
+
+    return shard_items(tenant.name, func.__module__, board_ids, run)
+
+
+def run_sharded(job, func):
+    """Envolve um job que não é dividido por board para rodar em uma única réplica por execução."""
+    def run():
+        shard_items(current_tenant().name, job, [WHOLE_JOB], lambda _: {WHOLE_JOB: func()})
+    return run
+
+
+def run_for_tenants(func, tenants=None):
+    """Executa `func()` uma vez por tenant, em paralelo e com falhas isoladas."""
+    tenants = tenants if tenants is not None else get_tenants()
+
+    def run(tenant):
+        with use_tenant(tenant), log_context(tenant=tenant.name):
+            try:
+                func()
+            except Exception as e:
+                logging.error("Ocorreu um erro no tenant %s: %s", tenant.name, e)
+
+    if len(tenants) == 1:
+        run(tenants[0])
+        return
+    # Copia o contexto (job, run_id) da thread que chamou para cada tenant
+    contexts = [contextvars.copy_context() for _ in tenants]
+    with ThreadPoolExecutor(max_workers=len(tenants), thread_name_prefix='tenant') as executor:
+        list(executor.map(lambda context, tenant: context.run(run, tenant), contexts, tenants))
@@ -0,0 +1,167 @@
+import argparse
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from issue_state import get_state
+from job_logging import log_context, setup_logging
+from tenants import get_tenants
+
+
+def verify_signature(secret, body, signature):
+    """Confere o cabeçalho X-Hub-Signature (sha256=<hmac>) enviado pelo Jira."""
+    if not secret:
+        return True
+    if not signature or not signature.startswith('sha256='):
+        return False
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature.split('=', 1)[1])
+
+
+class PayloadCapture:
+    """Grava cada payload recebido (JSON lines) para ser reaplicado depois com --replay."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, tenant, payload):
+        line = json.dumps({'tenant': tenant, 'received_at': time.time(), 'payload': payload}, ensure_ascii=False)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as file:
+            file.write(line + '\n')
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    # Preenchidos por `serve`
+    state = None
+    tenants = ()
+    secret = None
+    capture = None
+
+    def log_message(self, format, *args):
+        logging.debug("Webhook %s: " + format, self.client_address[0], *args)
+
+    def _reply(self, status, message=''):
+        body = message.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        # Verificação de saúde
+        self._reply(200, 'ok')
+
+    def do_POST(self):
+        # Rota: /jira/<tenant>; sem tenant, usa o primeiro configurado
+        parts = [part for part in self.path.split('?', 1)[0].split('/') if part]
+        if not parts or parts[0] != 'jira':
+            self._reply(404, 'rota desconhecida')
+            return
+        tenant = parts[1] if len(parts) > 1 else self.tenants[0]
+        if tenant not in self.tenants:
+            self._reply(404, f'tenant desconhecido: {tenant}')
+            return
+
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not verify_signature(self.secret, body, self.headers.get('X-Hub-Signature')):
+            logging.warning("Webhook com assinatura inválida recebido de %s.", self.client_address[0])
+            self._reply(401, 'assinatura inválida')
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._reply(400, 'JSON inválido')
+            return
+
+        if self.capture:
+            self.capture.write(tenant, payload)
+        with log_context(tenant=tenant):
+            try:
+                self.state.apply_event(tenant, payload)
+            except (KeyError, TypeError) as e:
+                logging.error("Erro ao aplicar evento %s: %s", payload.get('webhookEvent'), e)
+                self._reply(422, 'evento incompleto')
+                return
+        self._reply(204)
+
+
+def serve(host, port, state, capture_path=None):
+    WebhookHandler.state = state
+    WebhookHandler.tenants = tuple(tenant.name for tenant in get_tenants())
+    WebhookHandler.secret = os.getenv('JIRA_WEBHOOK_SECRET')
+    WebhookHandler.capture = PayloadCapture(capture_path) if capture_path else None
+    server = ThreadingHTTPServer((host, port), WebhookHandler)
+    logging.info("Recebendo webhooks do Jira em http://%s:%s/jira/<tenant>", host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def iter_captured(path, default_tenant):
+    """Payloads de um arquivo de captura (JSON lines) ou de um diretório de arquivos .json."""
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            if name.endswith('.json'):
+                with open(os.path.join(path, name), encoding='utf-8') as file:
+                    yield default_tenant, json.load(file)
+        return
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if 'payload' in entry:
+                yield entry.get('tenant') or default_tenant, entry['payload']
+            else:
+                yield default_tenant, entry
+
+
+def replay(path, state, default_tenant):
+    """Reaplica payloads capturados ao estado local, sem precisar do Jira."""
+    applied = 0
+    for tenant, payload in iter_captured(path, default_tenant):
+        if state.apply_event(tenant, payload):
+            applied += 1
+    logging.info("%s eventos reaplicados de %s.", applied, path)
+    return applied
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recebe webhooks do Jira e mantém o estado local das issues.")
+    parser.add_argument('--host', default=os.getenv('WEBHOOK_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('WEBHOOK_PORT', '8080')))
+    parser.add_argument('--capture', metavar='ARQUIVO', help="Grava os payloads recebidos (JSON lines).")
+    parser.add_argument('--replay', metavar='CAMINHO',
+                        help="Reaplica payloads capturados (arquivo JSON lines ou diretório de .json) e sai.")
+    parser.add_argument('--tenant', help="Tenant dos payloads reaplicados sem tenant (padrão: o primeiro).")
+    parser.add_argument('--insecure', action='store_true',
+                        help="Aceita webhooks sem assinatura quando JIRA_WEBHOOK_SECRET não está definido.")
+    args = parser.parse_args(argv)
+
+    setup_logging(job='webhook_receiver')
+    state = get_state()
+    if state is None:
+        logging.error("Defina ISSUE_STATE_DB para usar o receptor de webhooks.")
+        return 1
+    if args.replay:
+        replay(args.replay, state, args.tenant or get_tenants()[0].name)
+        return 0
+    if not os.getenv('JIRA_WEBHOOK_SECRET') and not args.insecure:
+        # Sem segredo qualquer um que alcance a porta altera o estado usado nos relatórios
+        logging.error("Defina JIRA_WEBHOOK_SECRET ou use --insecure para aceitar webhooks sem assinatura.")
+        return 1
+    serve(args.host, args.port, state, args.capture)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())